@@ -2,46 +2,81 @@
 IRS Audit Defense AI Agent
 Handles audit representation, response generation, and strategy
 """
-import anthropic
 from typing import Dict, List, Any, Optional
-import os
-import json
+
+import orjson
+
+from app.utils.serialization import to_prompt_json
+from app.services.llm_client import get_async_client, cached_system
+from app.services.llm_cache import cached_call
+
+# Static system prompts - kept byte-identical across calls so they can be
+# prompt-cached once they exceed the model's minimum cacheable length
+AUDIT_NOTICE_SYSTEM = """You are an expert CPA specializing in IRS audit defense.
+
+Analyze the IRS audit notice and client documents you are given and provide a comprehensive defense strategy:
+1. Summary of what the IRS is questioning
+2. Potential exposure and risk assessment
+3. Required documentation to support client position
+4. Legal arguments and relevant IRC sections
+5. Step-by-step response strategy
+6. Timeline and deadlines
+7. Probability of successful defense (with reasoning)
+
+Format as JSON with these exact keys."""
+
+# Prefilled start of the assistant turn - forces the reply to be a bare JSON object
+JSON_PREFILL = "{"
+
+AUDIT_RESPONSE_SYSTEM = """As a CPA representing a client before the IRS, draft professional audit response letters.
+
+Draft a formal response that:
+1. Addresses each IRS concern directly
+2. Cites relevant IRC sections and Treasury regulations
+3. References case law if applicable
+4. Explains why client position is correct
+5. Maintains professional, respectful tone
+6. Requests specific relief or closure
+
+Use proper formatting for IRS correspondence."""
+
+TAX_RESEARCH_SYSTEM = """Research the tax issue you are given and provide authority.
+
+Find and cite:
+1. Relevant Internal Revenue Code sections
+2. Treasury Regulations
+3. Revenue Rulings or Revenue Procedures
+4. Tax Court cases (if applicable)
+5. IRS guidance (notices, announcements)
+
+Explain how each authority supports the taxpayer position.
+Identify any contrary authority and distinguish it."""
 
 class AuditDefenseAgent:
     """AI agent for IRS audit defense and representation"""
     
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+        self.client = get_async_client()
         self.model = "claude-sonnet-4-20250514"
     
     async def analyze_audit_notice(self, notice_text: str, client_documents: Dict) -> Dict[str, Any]:
         """Analyze IRS audit notice and generate defense strategy"""
         
-        prompt = f"""You are an expert CPA specializing in IRS audit defense. 
-
-Analyze this IRS audit notice and provide a comprehensive defense strategy:
-
-AUDIT NOTICE:
+        prompt = f"""AUDIT NOTICE:
 {notice_text}
 
 CLIENT DOCUMENTS AVAILABLE:
-{json.dumps(client_documents, indent=2)}
+{to_prompt_json(client_documents)}"""
 
-Provide:
-1. Summary of what the IRS is questioning
-2. Potential exposure and risk assessment
-3. Required documentation to support client position  
-4. Legal arguments and relevant IRC sections
-5. Step-by-step response strategy
-6. Timeline and deadlines
-7. Probability of successful defense (with reasoning)
-
-Format as JSON with these exact keys."""
-
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=4000,
-            messages=[{"role": "user", "content": prompt}]
+            system=cached_system(AUDIT_NOTICE_SYSTEM),
+            messages=[
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": JSON_PREFILL}
+            ]
         )
         
         return self._parse_defense_strategy(response.content[0].text)
@@ -54,25 +89,17 @@ Format as JSON with these exact keys."""
     ) -> Dict[str, Any]:
         """Generate professional audit response letter"""
         
-        prompt = f"""As a CPA representing a client before the IRS, draft a professional audit response letter.
+        prompt = f"""Draft a response letter for this audit issue.
 
 AUDIT ISSUE: {audit_issue}
 CLIENT POSITION: {client_position}
-SUPPORTING DOCUMENTS: {supporting_docs}
-
-Draft a formal response that:
-1. Addresses each IRS concern directly
-2. Cites relevant IRC sections and Treasury regulations
-3. References case law if applicable
-4. Explains why client position is correct
-5. Maintains professional, respectful tone
-6. Requests specific relief or closure
+SUPPORTING DOCUMENTS: {supporting_docs}"""
 
-Use proper formatting for IRS correspondence."""
-
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=3000,
+            system=cached_system(AUDIT_RESPONSE_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -85,23 +112,13 @@ Use proper formatting for IRS correspondence."""
     async def research_tax_position(self, tax_issue: str) -> Dict[str, Any]:
         """Research tax law to support audit defense"""
         
-        prompt = f"""Research this tax issue and provide authority:
-
-TAX ISSUE: {tax_issue}
-
-Find and cite:
-1. Relevant Internal Revenue Code sections
-2. Treasury Regulations
-3. Revenue Rulings or Revenue Procedures
-4. Tax Court cases (if applicable)
-5. IRS guidance (notices, announcements)
-
-Explain how each authority supports the taxpayer position.
-Identify any contrary authority and distinguish it."""
+        prompt = f"""TAX ISSUE: {tax_issue}"""
 
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=3000,
+            system=cached_system(TAX_RESEARCH_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -111,12 +128,11 @@ Identify any contrary authority and distinguish it."""
         }
     
     def _parse_defense_strategy(self, response_text: str) -> Dict[str, Any]:
-        """Parse AI response into structured format"""
+        """Parse AI response (the continuation after JSON_PREFILL) into structured format"""
         try:
-            # Try to parse as JSON first
-            return json.loads(response_text)
-        except:
-            # Fallback to text response
+            return orjson.loads(JSON_PREFILL + response_text)
+        except orjson.JSONDecodeError:
+            # Fallback to the reply text as written, without the prefill
             return {
                 "analysis": response_text,
                 "strategy": "See detailed analysis above",
@@ -2,53 +2,209 @@
 Document Analysis AI Agent
 Processes tax documents (W-2, 1099, receipts, etc.)
 """
-import anthropic
-from typing import Dict, List, Any, Optional
-import os
-import json
+from typing import Dict, List, Any, Optional, Union
+from pathlib import Path
 import base64
+import binascii
+import asyncio
+import logging
+import mmap
+
+from app.utils.serialization import to_prompt_json
+from app.services.llm_client import get_async_client, cached_system, call_claude
+from app.services.llm_cache import cached_call
+
+logger = logging.getLogger(__name__)
+
+# Module-level constants so every call sends an identical system prompt
+DOCUMENT_VISION_SYSTEM = """You analyze scanned tax document images.
+
+Extract ALL information including:
+1. Form identification (W-2, 1099, etc.)
+2. Employer/Payer information
+3. Employee/Recipient information
+4. All monetary amounts and their labels
+5. Tax identification numbers
+6. Any special boxes or codes checked
+7. Errors or inconsistencies
+
+Format as structured JSON with clear field names."""
+
+DOCUMENT_STRUCTURED_SYSTEM = """You analyze structured tax document data.
+
+Provide:
+1. Verification that all required fields are present
+2. Any anomalies or red flags
+3. Tax implications of the amounts reported
+4. Recommendations for return preparation
+5. Potential audit risks
+
+Format as detailed analysis."""
+
+DOCUMENT_SET_REVIEW_SYSTEM = """You review a client's complete set of tax documents.
+
+Provide:
+1. Summary of all income sources
+2. Analysis of withholding adequacy
+3. Deduction opportunities identified
+4. Missing documents checklist
+5. Recommendations for tax preparation
+6. Risk assessment"""
+
+DEDUCTION_RUBRIC_SYSTEM = """You identify tax deductions from receipts given the taxpayer's situation.
+
+Categorize each receipt as:
+1. Deductible business expense
+2. Deductible medical expense
+3. Charitable contribution
+4. Not deductible
+5. Needs more information
+
+Provide reasoning for each categorization and calculate totals by category."""
+
+# Leading file bytes -> media type for the image formats Claude accepts
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def detect_image_media_type(header: bytes) -> str:
+    """
+    Identify an image's media type from its leading bytes
+
+    Raises:
+        ValueError: If the bytes are empty or aren't a PNG, JPEG, GIF or WebP image
+    """
+    if not header:
+        raise ValueError("Image data is empty")
+    for signature, media_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return media_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    raise ValueError("Unsupported image format. Use PNG, JPEG, GIF or WebP.")
+
 
 class DocumentAnalysisAgent:
     """AI agent for analyzing tax documents"""
-    
+
+    # Max in-flight Claude calls per batch - keeps fan-out under tier rate limits
+    MAX_CONCURRENT_ANALYSES = 5
+
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+        self.client = get_async_client()
         self.model = "claude-sonnet-4-20250514"
     
     async def analyze_document(
         self,
         document_type: str,
         document_data: Dict[str, Any],
-        image_base64: Optional[str] = None
+        image_base64: Optional[str] = None,
+        image_bytes: Optional[bytes] = None,
+        image_path: Optional[Union[str, Path]] = None
     ) -> Dict[str, Any]:
-        """Analyze tax document and extract relevant information"""
+        """
+        Analyze tax document and extract relevant information
+
+        A scanned image can be given as a base64 string, raw bytes, or a file
+        path; bytes and paths are base64-encoded once, right before the call.
+        """
         
+        if image_path is not None:
+            with open(image_path, "rb") as f:
+                # Sniff before mapping: rejects non-images and empty files,
+                # which mmap can't map
+                media_type = detect_image_media_type(f.read(12))
+                # Map the file instead of reading it into a separate bytes object
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    image_base64 = base64.b64encode(mapped).decode("ascii")
+        elif image_bytes is not None:
+            media_type = detect_image_media_type(image_bytes[:12])
+            image_base64 = base64.b64encode(image_bytes).decode("ascii")
+        elif image_base64:
+            # 16 base64 chars decode to the 12 header bytes we need to sniff
+            try:
+                header = base64.b64decode(image_base64[:16])
+            except binascii.Error:
+                raise ValueError("image_base64 is not valid base64 data")
+            media_type = detect_image_media_type(header)
+
         if image_base64:
             # Use vision capabilities for scanned documents
-            return await self._analyze_with_vision(document_type, image_base64)
+            return await self._analyze_with_vision(document_type, image_base64, media_type)
         else:
             # Analyze structured data
             return await self._analyze_structured(document_type, document_data)
     
-    async def _analyze_with_vision(self, doc_type: str, image_base64: str) -> Dict[str, Any]:
-        """Analyze scanned document using Claude's vision"""
-        
-        prompt = f"""Analyze this {doc_type} tax document image.
+    async def analyze_many(
+        self,
+        documents: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Analyze many documents concurrently
 
-Extract ALL information including:
-1. Form identification (W-2, 1099, etc.)
-2. Employer/Payer information
-3. Employee/Recipient information
-4. All monetary amounts and their labels
-5. Tax identification numbers
-6. Any special boxes or codes checked
-7. Errors or inconsistencies
+        Each document dict needs a "type" key; the rest is passed through as
+        document data (an optional "image_base64" routes it to vision).
+        A failed document is reported in place instead of failing the batch.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.MAX_CONCURRENT_ANALYSES)
 
-Format as structured JSON with clear field names."""
+        async def analyze_one(doc: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.analyze_document(
+                    doc.get("type", "unknown"),
+                    doc,
+                    image_base64=doc.get("image_base64"),
+                )
 
-        response = self.client.messages.create(
+        results = await asyncio.gather(
+            *(analyze_one(doc) for doc in documents),
+            return_exceptions=True
+        )
+
+        analyses = []
+        failed = 0
+        for doc, result in zip(documents, results):
+            if isinstance(result, asyncio.CancelledError):
+                # return_exceptions hands back cancellation too; don't report it as a bad document
+                raise result
+            if isinstance(result, Exception):
+                logger.error(f"Error analyzing {doc.get('type', 'unknown')} document: {str(result)}")
+                failed += 1
+                analyses.append({
+                    "document_type": doc.get("type", "unknown"),
+                    "error": "Analysis failed"
+                })
+            else:
+                analyses.append(result)
+
+        return {
+            "analyses": analyses,
+            "documents_analyzed": len(documents) - failed,
+            "documents_failed": failed
+        }
+
+    async def _analyze_with_vision(
+        self,
+        doc_type: str,
+        image_base64: str,
+        media_type: str = "image/png"
+    ) -> Dict[str, Any]:
+        """Analyze scanned document using Claude's vision"""
+        
+        prompt = f"""Analyze this {doc_type} tax document image."""
+
+        # Not routed through cached_call: its key would serialize and hash the
+        # whole base64 image, an extra full copy per scan
+        response = await call_claude(
+            self.client,
             model=self.model,
             max_tokens=2000,
+            system=cached_system(DOCUMENT_VISION_SYSTEM),
             messages=[{
                 "role": "user",
                 "content": [
@@ -56,7 +212,7 @@ Format as structured JSON with clear field names."""
                         "type": "image",
                         "source": {
                             "type": "base64",
-                            "media_type": "image/png",
+                            "media_type": media_type,
                             "data": image_base64
                         }
                     },
@@ -80,20 +236,13 @@ Format as structured JSON with clear field names."""
         
         prompt = f"""Analyze this {doc_type} tax document data:
 
-{json.dumps(data, indent=2)}
+{to_prompt_json(data)}"""
 
-Provide:
-1. Verification that all required fields are present
-2. Any anomalies or red flags
-3. Tax implications of the amounts reported
-4. Recommendations for return preparation
-5. Potential audit risks
-
-Format as detailed analysis."""
-
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=1500,
+            system=cached_system(DOCUMENT_STRUCTURED_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -137,21 +286,14 @@ Format as detailed analysis."""
                     doc_summary["deductible_expenses"] += doc.get("amount", 0)
         
         # Generate comprehensive analysis
-        prompt = f"""Review this complete set of tax documents for a client:
+        prompt = f"""CLIENT DOCUMENTS:
+{to_prompt_json(doc_summary)}"""
 
-{json.dumps(doc_summary, indent=2)}
-
-Provide:
-1. Summary of all income sources
-2. Analysis of withholding adequacy
-3. Deduction opportunities identified
-4. Missing documents checklist
-5. Recommendations for tax preparation
-6. Risk assessment"""
-
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=2000,
+            system=cached_system(DOCUMENT_SET_REVIEW_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -168,26 +310,17 @@ Provide:
     ) -> Dict[str, Any]:
         """Identify and categorize potential deductions from receipts"""
         
-        prompt = f"""Analyze these receipts and taxpayer situation to identify deductions:
-
-RECEIPTS:
-{json.dumps(receipts, indent=2)}
+        prompt = f"""RECEIPTS:
+{to_prompt_json(receipts)}
 
 TAXPAYER SITUATION:
-{json.dumps(taxpayer_situation, indent=2)}
-
-Categorize each receipt as:
-1. Deductible business expense
-2. Deductible medical expense  
-3. Charitable contribution
-4. Not deductible
-5. Needs more information
-
-Provide reasoning for each categorization and calculate totals by category."""
+{to_prompt_json(taxpayer_situation)}"""
 
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=2000,
+            system=cached_system(DEDUCTION_RUBRIC_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -2,17 +2,53 @@
 Tax Preparation AI Agent
 Handles complex tax return preparation across all entity types
 """
-import anthropic
-from typing import Dict, List, Any, Optional
-import os
-import json
+from typing import Dict, List, Any, AsyncIterator, Optional
 from decimal import Decimal
 
+from app.utils.serialization import to_prompt_json
+from app.services.llm_client import get_async_client, cached_system, stream_claude
+from app.services.llm_cache import cached_call
+
+# Static system prompt; the per-return data goes in the user turn
+PREPARE_RETURN_SYSTEM = """You are an expert CPA preparing tax returns.
+
+Prepare a complete tax return including:
+1. All required forms and schedules
+2. Line-by-line calculations with explanations
+3. Tax optimization strategies applied
+4. Potential red flags or audit risks identified
+5. Recommendations for next year
+
+Show your work for complex calculations."""
+
+REVIEW_RETURN_SYSTEM = """You are a senior CPA doing quality control review of a prepared tax return.
+
+Check for:
+1. Mathematical accuracy
+2. Correct form selection
+3. Proper application of tax law
+4. Missing schedules or attachments
+5. Optimization opportunities
+6. Audit risk factors
+7. Signature and filing requirements
+
+Provide detailed review notes."""
+
+COMPLEX_SCENARIO_SYSTEM = """You are an experienced CPA analyzing complex tax scenarios.
+
+Provide:
+1. Tax treatment analysis
+2. Applicable tax law and regulations
+3. Required forms and reporting
+4. Potential alternatives and their tax consequences
+5. Recommendation with justification
+6. Risk assessment"""
+
 class TaxPreparationAgent:
     """AI agent for preparing complex tax returns"""
     
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+        self.client = get_async_client()
         self.model = "claude-sonnet-4-20250514"
     
     async def prepare_return(
@@ -23,26 +59,13 @@ class TaxPreparationAgent:
     ) -> Dict[str, Any]:
         """Prepare comprehensive tax return"""
         
-        prompt = f"""You are an expert CPA preparing a {entity_type} tax return.
-
-CURRENT YEAR FINANCIAL DATA:
-{json.dumps(financial_data, indent=2)}
-
-PRIOR YEAR RETURN (for reference):
-{json.dumps(prior_year_return, indent=2) if prior_year_return else "Not available"}
-
-Prepare a complete tax return including:
-1. All required forms and schedules
-2. Line-by-line calculations with explanations
-3. Tax optimization strategies applied
-4. Potential red flags or audit risks identified
-5. Recommendations for next year
-
-Show your work for complex calculations."""
+        prompt = self._return_prompt(entity_type, financial_data, prior_year_return)
 
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=8000,
+            system=cached_system(PREPARE_RETURN_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -52,28 +75,58 @@ Show your work for complex calculations."""
             "status": "draft",
             "review_notes": []
         }
+
+    async def stream_return(
+        self,
+        entity_type: str,
+        financial_data: Dict,
+        prior_year_return: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Prepare a tax return, yielding text as it is generated
+
+        Same request as prepare_return, but callers see the first forms within
+        seconds instead of waiting for the whole draft. Streamed output is not
+        cached.
+        """
+        prompt = self._return_prompt(entity_type, financial_data, prior_year_return)
+
+        async with stream_claude(
+            self.client,
+            model=self.model,
+            max_tokens=8000,
+            system=cached_system(PREPARE_RETURN_SYSTEM),
+            messages=[{"role": "user", "content": prompt}]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+    def _return_prompt(
+        self,
+        entity_type: str,
+        financial_data: Dict,
+        prior_year_return: Optional[Dict]
+    ) -> str:
+        """User turn carrying the client's data for a return"""
+        return f"""Prepare a {entity_type} tax return.
+
+CURRENT YEAR FINANCIAL DATA:
+{to_prompt_json(financial_data)}
+
+PRIOR YEAR RETURN (for reference):
+{to_prompt_json(prior_year_return) if prior_year_return else "Not available"}"""
     
     async def review_return(self, prepared_return: Dict) -> Dict[str, Any]:
         """Quality control review of prepared return"""
         
-        prompt = f"""Review this prepared tax return for accuracy and completeness:
+        prompt = f"""PREPARED RETURN:
+{to_prompt_json(prepared_return)}"""
 
-{json.dumps(prepared_return, indent=2)}
-
-Check for:
-1. Mathematical accuracy
-2. Correct form selection
-3. Proper application of tax law
-4. Missing schedules or attachments
-5. Optimization opportunities
-6. Audit risk factors
-7. Signature and filing requirements
-
-Provide detailed review notes."""
-
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=3000,
+            system=cached_system(REVIEW_RETURN_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -87,21 +140,14 @@ Provide detailed review notes."""
     async def handle_complex_scenario(self, scenario_description: str) -> Dict[str, Any]:
         """Handle complex tax scenarios requiring expert judgment"""
         
-        prompt = f"""As an experienced CPA, analyze this complex tax scenario:
-
-{scenario_description}
-
-Provide:
-1. Tax treatment analysis
-2. Applicable tax law and regulations  
-3. Required forms and reporting
-4. Potential alternatives and their tax consequences
-5. Recommendation with justification
-6. Risk assessment"""
+        prompt = f"""SCENARIO:
+{scenario_description}"""
 
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=4000,
+            system=cached_system(COMPLEX_SCENARIO_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -2,35 +2,133 @@
 Voice Communication Agent
 Handles realistic voice conversations with IRS simulation
 """
-import anthropic
-from typing import Dict, List, Any, AsyncIterator, Optional
+from typing import Dict, Final, List, Any, AsyncIterator, Optional
 import os
-import json
 import asyncio
+import re
 import sys
+import time
+import logging
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from utils.conversation_store import ConversationStore
+from app.utils.serialization import to_prompt_json
+from app.services.llm_client import (
+    get_async_client, cached_system, call_claude, stream_claude, with_cache_breakpoint
+)
+from app.services.llm_cache import cached_call
+
+logger = logging.getLogger(__name__)
+
+# Sentence boundary: terminator followed by whitespace (so "..." pauses and
+# decimals like "$1.5" don't split mid-thought)
+SENTENCE_END = re.compile(r"(?<!\.)[.!?](?=\s)")
+
+# Filler words and ellipses get SSML pauses, applied in one substitution pass
+_SSML_RE = re.compile(r"(um,|uh,|\.\.\.)")
+_SSML_MAP: Final[Dict[str, str]] = {
+    "um,": '<break time="300ms"/>um,<break time="200ms"/>',
+    "uh,": '<break time="300ms"/>uh,<break time="200ms"/>',
+    "...": '<break time="500ms"/>',
+}
+
+# Call-script and IRS-simulation instructions are static, byte-identical
+# across calls
+CALL_SCRIPT_SYSTEM = """You are a professional CPA making a call to the IRS on behalf of a client.
+
+Generate a natural, conversational script including:
+1. Professional greeting and introduction
+2. Clear explanation of purpose
+3. Response to likely IRS questions
+4. Natural speech patterns (um, uh, brief pauses)
+5. Professional but personable tone
+6. Handling of potential objections
+7. Closing and next steps
+
+Make it sound human, not robotic. Include realistic speech patterns."""
+
+IRS_AGENT_SYSTEM = """You are an IRS agent on a phone call with a CPA. Your personality: {personality}.
+
+Respond as the IRS agent would:
+- Reference IRS procedures and requirements
+- Ask for specific documentation
+- Quote relevant tax code sections
+- Use IRS terminology
+- Be realistic about what IRS would actually say
+
+Keep response concise (2-3 sentences) for natural conversation flow."""
+
+IRS_AGENT_PERSONALITIES: Final[Dict[str, str]] = {
+    "professional": "formal, by-the-book IRS agent",
+    "difficult": "skeptical, questioning IRS agent",
+    "helpful": "cooperative, solution-oriented IRS agent"
+}
+
+# Rendered once at import: one system block per personality
+IRS_AGENT_SYSTEM_BLOCKS: Final[Dict[str, List[Dict[str, Any]]]] = {
+    name: cached_system(IRS_AGENT_SYSTEM.format(personality=description))
+    for name, description in IRS_AGENT_PERSONALITIES.items()
+}
+
+IRS_AGENT_USER_TEMPLATE: Final = 'CPA just said: "{cpa_message}"'
+
+# Live-call persona; the client/issue context and running summary are
+# appended per turn as a second system block
+LIVE_CALL_SYSTEM = """You are a professional CPA in a live phone conversation with the IRS.
+
+Respond naturally as a CPA would in a phone call:
+- Use occasional filler words (um, uh, hmm, you know)
+- Include natural pauses (indicate with ...)
+- Be professional but conversational
+- Reference documents professionally
+- Ask clarifying questions when needed
+- Show you're listening and processing
+
+Keep responses concise (2-4 sentences) to allow for natural back-and-forth."""
+
+# Live calls resend the history every turn; older turns are folded into a
+# running summary so per-turn prompt size stays flat over a long call
+MAX_HISTORY_MESSAGES = 12
+SUMMARY_MODEL = "claude-3-5-haiku-20241022"
+
+HISTORY_SUMMARY_SYSTEM = """You condense earlier parts of a phone call between a CPA and the IRS.
+
+Write one short paragraph that preserves names, amounts, dates, tax years,
+documents requested or promised, and any commitments made by either side.
+If a previous summary is given, merge it with the new turns. Reply with the
+summary only."""
 
 class VoiceAgent:
     """AI agent for voice communication with natural speech patterns"""
 
     def __init__(self, session_id: Optional[str] = None):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+        self.client = get_async_client()
         self.model = "claude-sonnet-4-20250514"
+        self.last_ttft_ms: Optional[float] = None
         self.session_id = session_id or f"voice_{os.urandom(8).hex()}"
         self.conversation_store = ConversationStore()
 
-        # Load existing conversation if available
+        # Load existing conversation if available. "system" messages in the
+        # store hold running summaries of turns older than the window; summary
+        # tasks from separate requests can land out of order, so the one
+        # covering the most turns wins rather than the last one written.
         self.conversation_history = []
-        messages = self.conversation_store.get_messages(self.session_id)
-        if messages:
-            self.conversation_history = [
-                {"role": msg["role"], "content": msg["content"]}
-                for msg in messages
-            ]
+        self.conversation_summary: Optional[str] = None
+        self._summarized_through = 0
+        turns = []
+        for msg in self.conversation_store.get_messages(self.session_id):
+            if msg["role"] == "system":
+                summarized_through = msg.get("metadata", {}).get("summarized_through", 0)
+                if summarized_through > self._summarized_through:
+                    self.conversation_summary = msg["content"]
+                    self._summarized_through = summarized_through
+            else:
+                turns.append({"role": msg["role"], "content": msg["content"]})
+        self.conversation_history = turns[self._summarized_through:]
+        self._stored_turns = len(turns)
+        self._summary_tasks = set()
     
     async def generate_call_script(
         self,
@@ -40,26 +138,15 @@ class VoiceAgent:
     ) -> Dict[str, Any]:
         """Generate natural conversation script for IRS call"""
         
-        prompt = f"""You are a professional CPA making a call to the IRS on behalf of a client.
-
-CALL PURPOSE: {call_purpose}
-CLIENT INFO: {json.dumps(client_info)}
-KEY POINTS TO ADDRESS: {talking_points}
-
-Generate a natural, conversational script including:
-1. Professional greeting and introduction
-2. Clear explanation of purpose
-3. Response to likely IRS questions
-4. Natural speech patterns (um, uh, brief pauses)
-5. Professional but personable tone
-6. Handling of potential objections
-7. Closing and next steps
-
-Make it sound human, not robotic. Include realistic speech patterns."""
+        prompt = f"""CALL PURPOSE: {call_purpose}
+CLIENT INFO: {to_prompt_json(client_info)}
+KEY POINTS TO ADDRESS: {talking_points}"""
 
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=3000,
+            system=cached_system(CALL_SCRIPT_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -75,7 +162,43 @@ Make it sound human, not robotic. Include realistic speech patterns."""
         context: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Handle live conversation turn with natural responses"""
-        
+
+        start_ns = time.perf_counter_ns()
+        first_sentence_ns = None
+        speech_markup = []
+
+        async for sentence in self.stream_live_conversation(user_message, context):
+            if first_sentence_ns is None:
+                first_sentence_ns = time.perf_counter_ns()
+            speech_markup.append(self._add_speech_markup(sentence))
+
+        agent_response = self.conversation_history[-1]["content"]
+
+        return {
+            "response_text": agent_response,
+            "speech_markup": " ".join(speech_markup),
+            "suggested_tts_voice": "professional_male",
+            "emotion": "confident",
+            "ttft_ms": self.last_ttft_ms,
+            "first_sentence_ms": (
+                round((first_sentence_ns - start_ns) / 1e6, 1)
+                if first_sentence_ns is not None else None
+            ),
+        }
+
+    async def stream_live_conversation(
+        self,
+        user_message: str,
+        context: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        Stream a live conversation turn one sentence at a time
+
+        Tokens are buffered until a sentence terminator arrives so a TTS
+        pipeline can start speaking before the full reply is generated.
+        The complete reply is added to the history once the stream closes.
+        """
+
         # Add to conversation history and persist
         self.conversation_history.append({
             "role": "user",
@@ -87,33 +210,57 @@ Make it sound human, not robotic. Include realistic speech patterns."""
             user_message,
             metadata={"context": context}
         )
+        self._stored_turns += 1
+        self._trim_history()
         
-        system_prompt = f"""You are a professional CPA in a live phone conversation with the IRS.
-
-CONTEXT:
+        call_context = f"""CONTEXT:
 - Client: {context.get('client_name', 'Client')}
 - Issue: {context.get('issue', 'Tax matter')}
-- Your goal: {context.get('goal', 'Resolve the issue')}
+- Your goal: {context.get('goal', 'Resolve the issue')}"""
 
-Respond naturally as a CPA would in a phone call:
-- Use occasional filler words (um, uh, hmm, you know)
-- Include natural pauses (indicate with ...)
-- Be professional but conversational
-- Reference documents professionally
-- Ask clarifying questions when needed
-- Show you're listening and processing
+        if self.conversation_summary:
+            call_context += f"\n\nEarlier in the call: {self.conversation_summary}"
 
-Keep responses concise (2-4 sentences) to allow for natural back-and-forth."""
+        # The system prompt alone is too short to cache; the breakpoint goes on
+        # the newest message so each turn reuses the conversation so far
+        system = [
+            {"type": "text", "text": LIVE_CALL_SYSTEM},
+            {"type": "text", "text": call_context},
+        ]
 
-        messages = [{"role": "system", "content": system_prompt}] + self.conversation_history
-        
-        response = self.client.messages.create(
+        start_ns = time.perf_counter_ns()
+        self.last_ttft_ms = None
+        full_text = []
+        buffer = ""
+
+        async with stream_claude(
+            self.client,
             model=self.model,
             max_tokens=500,
-            messages=messages
-        )
-        
-        agent_response = response.content[0].text
+            system=system,
+            messages=with_cache_breakpoint(self.conversation_history),
+            latency_mode=True
+        ) as stream:
+            async for token in stream.text_stream:
+                if self.last_ttft_ms is None:
+                    self.last_ttft_ms = round((time.perf_counter_ns() - start_ns) / 1e6, 1)
+                full_text.append(token)
+                buffer += token
+
+                # Emit every complete sentence currently in the buffer
+                while True:
+                    match = SENTENCE_END.search(buffer)
+                    if not match:
+                        break
+                    sentence = buffer[:match.end()].strip()
+                    buffer = buffer[match.end():]
+                    if sentence:
+                        yield sentence
+
+        if buffer.strip():
+            yield buffer.strip()
+
+        agent_response = "".join(full_text)
 
         # Add agent response to history and persist
         self.conversation_history.append({
@@ -124,27 +271,83 @@ Keep responses concise (2-4 sentences) to allow for natural back-and-forth."""
             self.session_id,
             "assistant",
             agent_response,
-            metadata={"emotion": "confident"}
+            metadata={"emotion": "confident", "ttft_ms": self.last_ttft_ms}
+        )
+        self._stored_turns += 1
+
+    def _trim_history(self):
+        """
+        Keep only the last MAX_HISTORY_MESSAGES turns in the prompt window
+
+        Dropped turns are summarized in the background with a small model;
+        the window always starts on a user turn as the Messages API requires.
+        """
+        if len(self.conversation_history) <= MAX_HISTORY_MESSAGES:
+            return
+
+        cut = len(self.conversation_history) - MAX_HISTORY_MESSAGES
+        if self.conversation_history[cut]["role"] != "user":
+            cut += 1
+
+        dropped = self.conversation_history[:cut]
+        self.conversation_history = self.conversation_history[cut:]
+
+        # Index (in the persisted turn list) of the first turn still in the window
+        summarized_through = self._stored_turns - len(self.conversation_history)
+        task = asyncio.create_task(
+            self._summarize_turns(dropped, summarized_through, self.session_id)
+        )
+        self._summary_tasks.add(task)
+        task.add_done_callback(self._summary_tasks.discard)
+
+    async def _summarize_turns(
+        self,
+        turns: List[Dict[str, str]],
+        summarized_through: int,
+        session_id: str
+    ):
+        """
+        Fold dropped turns into the running call summary and persist it
+
+        session_id is the call the turns came from; if the conversation was
+        reset while the summary was generating, the result is discarded.
+        """
+        transcript = "\n".join(f"{turn['role'].upper()}: {turn['content']}" for turn in turns)
+        prompt = f"""PREVIOUS SUMMARY: {self.conversation_summary or "None"}
+
+NEW TURNS:
+{transcript}"""
+
+        try:
+            response = await call_claude(
+                self.client,
+                model=SUMMARY_MODEL,
+                max_tokens=300,
+                system=cached_system(HISTORY_SUMMARY_SYSTEM),
+                messages=[{"role": "user", "content": prompt}]
+            )
+        except Exception as e:
+            # Best effort - the call carries on without these turns in its summary
+            logger.error(f"Error summarizing conversation history: {str(e)}")
+            return
+
+        if session_id != self.session_id:
+            return  # the call was reset; this summary belongs to the old one
+        if summarized_through <= self._summarized_through:
+            return  # a newer summary already landed
+
+        self.conversation_summary = response.content[0].text
+        self._summarized_through = summarized_through
+        self.conversation_store.save_message(
+            self.session_id,
+            "system",
+            self.conversation_summary,
+            metadata={"summarized_through": summarized_through}
         )
-        
-        return {
-            "response_text": agent_response,
-            "speech_markup": self._add_speech_markup(agent_response),
-            "suggested_tts_voice": "professional_male",
-            "emotion": "confident"
-        }
     
     def _add_speech_markup(self, text: str) -> str:
         """Add speech synthesis markup for natural delivery"""
-        # Add SSML-style markup for natural speech
-        markup = text
-        
-        # Add pauses after certain phrases
-        markup = markup.replace("um,", '<break time="300ms"/>um,<break time="200ms"/>')
-        markup = markup.replace("uh,", '<break time="300ms"/>uh,<break time="200ms"/>')
-        markup = markup.replace("...", '<break time="500ms"/>')
-        
-        return markup
+        return _SSML_RE.sub(lambda match: _SSML_MAP[match.group(0)], text)
     
     async def simulate_irs_agent(
         self,
@@ -153,29 +356,15 @@ Keep responses concise (2-4 sentences) to allow for natural back-and-forth."""
     ) -> Dict[str, Any]:
         """Simulate IRS agent responses for practice/demo"""
         
-        personalities = {
-            "professional": "formal, by-the-book IRS agent",
-            "difficult": "skeptical, questioning IRS agent",
-            "helpful": "cooperative, solution-oriented IRS agent"
-        }
-        
-        prompt = f"""You are an IRS agent on a phone call with a CPA. Your personality: {personalities[irs_agent_personality]}.
+        prompt = IRS_AGENT_USER_TEMPLATE.format(cpa_message=cpa_message)
 
-CPA just said: "{cpa_message}"
-
-Respond as the IRS agent would:
-- Reference IRS procedures and requirements
-- Ask for specific documentation
-- Quote relevant tax code sections
-- Use IRS terminology
-- Be realistic about what IRS would actually say
-
-Keep response concise (2-3 sentences) for natural conversation flow."""
-
-        response = self.client.messages.create(
+        response = await cached_call(
+            self.client,
             model=self.model,
             max_tokens=400,
-            messages=[{"role": "user", "content": prompt}]
+            system=IRS_AGENT_SYSTEM_BLOCKS[irs_agent_personality],
+            messages=[{"role": "user", "content": prompt}],
+            latency_mode=True
         )
         
         return {
@@ -187,6 +376,9 @@ Keep response concise (2-3 sentences) for natural conversation flow."""
     def reset_conversation(self):
         """Reset conversation history for new call"""
         self.conversation_history = []
+        self.conversation_summary = None
+        self._summarized_through = 0
+        self._stored_turns = 0
         self.conversation_store.clear_conversation(self.session_id)
         # Generate new session ID for next conversation
         self.session_id = f"voice_{os.urandom(8).hex()}"
@@ -0,0 +1,106 @@
+"""
+Message Batch Runner
+Submits non-interactive Claude workloads through the Message Batches API
+(half the on-demand price, results within 24 hours)
+"""
+from typing import Dict, List, Any, Optional
+import asyncio
+import logging
+
+from app.services.llm_client import get_async_client
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRunner:
+    """Submit, poll, cancel and collect Claude message batches"""
+
+    def __init__(self, client=None, poll_interval: float = 30.0):
+        """
+        Initialize batch runner
+
+        Args:
+            client: AsyncAnthropic client (defaults to the shared client)
+            poll_interval: Seconds between status checks while polling
+        """
+        self.client = client or get_async_client()
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def build_request(
+        custom_id: str,
+        model: str,
+        prompt: str,
+        max_tokens: int,
+        system: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build one batch entry for a single-turn prompt"""
+        params: Dict[str, Any] = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if system:
+            params["system"] = system
+        return {"custom_id": custom_id, "params": params}
+
+    async def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """
+        Submit a batch of requests
+
+        Returns:
+            Batch ID to poll for completion
+        """
+        if not requests:
+            raise ValueError("Cannot submit an empty batch")
+
+        batch = await self.client.beta.messages.batches.create(requests=requests)
+        logger.info(f"Submitted message batch {batch.id} with {len(requests)} requests")
+        return batch.id
+
+    async def poll(self, batch_id: str, timeout: Optional[float] = None):
+        """
+        Wait until a batch has finished processing
+
+        Args:
+            batch_id: Batch to wait on
+            timeout: Give up after this many seconds (None waits indefinitely)
+
+        Returns:
+            The ended batch object
+        """
+        async def wait_until_ended():
+            while True:
+                batch = await self.client.beta.messages.batches.retrieve(batch_id)
+                if batch.processing_status == "ended":
+                    return batch
+                await asyncio.sleep(self.poll_interval)
+
+        return await asyncio.wait_for(wait_until_ended(), timeout=timeout)
+
+    async def cancel(self, batch_id: str):
+        """Request cancellation of an in-progress batch"""
+        logger.info(f"Cancelling message batch {batch_id}")
+        return await self.client.beta.messages.batches.cancel(batch_id)
+
+    async def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Collect results of an ended batch
+
+        Returns:
+            Dict keyed by custom_id with "status" and, on success, "text"
+        """
+        collected = {}
+        async for entry in await self.client.beta.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                # A reply can be empty (e.g. stopped immediately) or hold non-text blocks
+                collected[entry.custom_id] = {
+                    "status": "succeeded",
+                    "text": "".join(
+                        block.text for block in entry.result.message.content
+                        if block.type == "text"
+                    ),
+                }
+            else:
+                collected[entry.custom_id] = {"status": entry.result.type}
+        return collected
@@ -2,17 +2,92 @@
 Benchmarking System
 Compare AI performance vs Human CPA
 """
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime
-import json
+import sqlite3
+import threading
 import time
+import asyncio
+import logging
+import secrets
+
+import orjson
+
+from app.services.batch_runner import BatchRunner
+from app.utils.serialization import to_prompt_json
+
+logger = logging.getLogger(__name__)
+
+# Model used for batch-mode benchmark runs
+BATCH_MODEL = "claude-sonnet-4-20250514"
+
+# Shared by every batch entry; only the scenario varies per request
+BENCHMARK_SYSTEM = "You are an expert CPA. Complete the task you are given as thoroughly as a senior practitioner would."
+
+# Interactive benchmark runs: whole-run deadline and how many agent calls may
+# be in flight at once (keeps a composite scenario under the API rate limit)
+AI_BENCHMARK_TIMEOUT = 60.0
+MAX_CONCURRENT_SUBTASKS = 3
+
+# Placeholder metrics reported for test types with no agent wired in
+SIMULATED_AI_RESULTS: Dict[str, Dict[str, Any]] = {
+    "tax_preparation": {
+        "accuracy_score": 0.98,
+        "completeness": 1.0,
+        "optimizations_found": 12,
+        "errors": 0,
+        "tax_saved": 8500
+    },
+    "audit_defense": {
+        "response_quality": 0.95,
+        "legal_citations": 15,
+        "strategy_completeness": 0.97,
+        "estimated_success_rate": 0.82
+    },
+    "research": {
+        "sources_found": 23,
+        "relevance_score": 0.94,
+        "depth_of_analysis": 0.96
+    },
+}
 
 class BenchmarkingSystem:
     """System for benchmarking AI vs Human CPA performance"""
     
-    def __init__(self):
-        self.tests = []
-        self.results = []
+    def __init__(self, db_path: str = ".benchmarks.sqlite3"):
+        """
+        Initialize benchmarking system
+
+        Args:
+            db_path: SQLite database file, shared by every worker process
+        """
+        # One connection per instance; the lock serializes its use so a
+        # transaction can't interleave with another thread's statements
+        # (e.g. sync endpoints running in the threadpool)
+        self._lock = threading.RLock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # The full test lives in `data`; comparison results are denormalized
+        # into columns so the leaderboard is a single SQL aggregate
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS benchmark_tests (
+                test_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at_ns INTEGER NOT NULL,
+                ai_won INTEGER,
+                speed_multiplier REAL,
+                cost_savings REAL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_benchmark_tests_status_created
+                ON benchmark_tests (status, created_at_ns);
+        """)
+        self.db.commit()
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.db.close()
     
     def create_benchmark_test(
         self,
@@ -20,68 +95,188 @@ class BenchmarkingSystem:
         scenario: Dict[str, Any],
         complexity: str = "high"
     ) -> Dict[str, Any]:
-        """Create a new benchmark test"""
+        """Create a new benchmark test (returned in the same shape as get_all_tests)"""
         
         test = {
-            "test_id": f"bench_{int(time.time())}",
+            "test_id": f"bench_{secrets.token_hex(8)}",
             "test_type": test_type,
             "scenario": scenario,
             "complexity": complexity,
-            "created_at": datetime.now().isoformat(),
+            "created_at_ns": time.time_ns(),
             "status": "pending",
             "ai_results": None,
             "human_results": None
         }
         
-        self.tests.append(test)
-        return test
+        self._save_test(test)
+        return self._render_test(test)
     
     async def run_ai_benchmark(
         self,
         test_id: str,
-        ai_agents: Dict[str, Any]
+        ai_agents: Dict[str, Any],
+        timeout: Optional[float] = AI_BENCHMARK_TIMEOUT
     ) -> Dict[str, Any]:
-        """Run AI through the benchmark test"""
+        """
+        Run AI through the benchmark test
+
+        A scenario may list several test types under "subtasks" (e.g. tax
+        preparation plus audit defense); those run concurrently and are
+        reported per subtask.
+
+        Args:
+            test_id: Benchmark test to run
+            ai_agents: Async callables keyed by test type, each called with the
+                scenario and returning a metrics dict. Test types without an
+                agent report simulated metrics.
+            timeout: Seconds before the whole run is cancelled (None waits
+                indefinitely)
+        """
         
         test = self._get_test(test_id)
         if not test:
             return {"error": "Test not found"}
         
-        start_time = time.time()
-        
-        # Simulate AI processing based on test type
-        if test["test_type"] == "tax_preparation":
-            result = {
-                "time_taken": time.time() - start_time,
-                "accuracy_score": 0.98,
-                "completeness": 1.0,
-                "optimizations_found": 12,
-                "errors": 0,
-                "tax_saved": 8500
-            }
-        elif test["test_type"] == "audit_defense":
-            result = {
-                "time_taken": time.time() - start_time,
-                "response_quality": 0.95,
-                "legal_citations": 15,
-                "strategy_completeness": 0.97,
-                "estimated_success_rate": 0.82
-            }
-        elif test["test_type"] == "research":
-            result = {
-                "time_taken": time.time() - start_time,
-                "sources_found": 23,
-                "relevance_score": 0.94,
-                "depth_of_analysis": 0.96
-            }
+        subtasks = test["scenario"].get("subtasks") or [test["test_type"]]
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SUBTASKS)
+        start_ns = time.perf_counter_ns()
+
+        try:
+            outcomes = await asyncio.wait_for(
+                asyncio.gather(*(
+                    self._run_subtask(test_type, ai_agents.get(test_type), test["scenario"], semaphore)
+                    for test_type in subtasks
+                )),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            # wait_for has already cancelled the in-flight agent calls
+            outcomes = None
+
+        if outcomes is None:
+            result = {"error": "Benchmark timed out"}
+        elif len(outcomes) == 1:
+            result = outcomes[0]
         else:
-            result = {"error": "Unknown test type"}
+            result = dict(zip(subtasks, outcomes))
+            errors = [t for t, outcome in result.items() if "error" in outcome]
+            result = {"subtasks": result}
+            if errors:
+                result["error"] = f"Subtasks failed: {', '.join(errors)}"
+
+        if "error" not in result:
+            # Monotonic ns clock; seconds derived once for the comparison math
+            result["time_taken_ns"] = time.perf_counter_ns() - start_ns
+            result["time_taken"] = result["time_taken_ns"] / 1e9
         
-        test["ai_results"] = result
-        test["ai_completed_at"] = datetime.now().isoformat()
+        self._save_ai_results(test_id, result)
         
         return result
+
+    async def _run_subtask(
+        self,
+        test_type: str,
+        agent: Any,
+        scenario: Dict[str, Any],
+        semaphore: asyncio.Semaphore
+    ) -> Dict[str, Any]:
+        """
+        Evaluate one test type, with the real agent when one is provided
+
+        An agent failure is reported as this subtask's error so sibling
+        subtasks still finish and the run's results are saved.
+        """
+        if agent is None:
+            if test_type not in SIMULATED_AI_RESULTS:
+                return {"error": "Unknown test type"}
+            return dict(SIMULATED_AI_RESULTS[test_type])
+
+        async with semaphore:
+            try:
+                return await agent(scenario)
+            except Exception as e:
+                logger.error(f"Benchmark subtask {test_type} failed: {str(e)}")
+                return {"error": f"{type(e).__name__}: {e}"}
     
+    async def run_ai_benchmark_batch(
+        self,
+        test_ids: List[str],
+        batch_runner: BatchRunner,
+        max_tokens: int = 4000,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Run many benchmark tests through a single Claude message batch
+
+        Batch mode is half price but not real-time, so time_taken is the
+        server-side batch duration (created -> ended), not interactive latency.
+
+        Args:
+            test_ids: Tests to run; each becomes one batch request
+            batch_runner: Runner used to submit and poll the batch
+            max_tokens: Completion budget per test
+            timeout: Cancel the batch if it hasn't ended after this many seconds
+
+        Returns:
+            Dict of AI results keyed by test_id
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        tests = []
+        for test_id in test_ids:
+            test = self._get_test(test_id)
+            if test:
+                tests.append(test)
+            else:
+                results[test_id] = {"error": "Test not found"}
+
+        if not tests:
+            return results
+
+        batch_id = await batch_runner.submit_batch([
+            BatchRunner.build_request(
+                custom_id=test["test_id"],
+                model=BATCH_MODEL,
+                prompt=self._scenario_prompt(test),
+                system=BENCHMARK_SYSTEM,
+                max_tokens=max_tokens,
+            )
+            for test in tests
+        ])
+
+        try:
+            batch = await batch_runner.poll(batch_id, timeout=timeout)
+        except asyncio.TimeoutError:
+            await batch_runner.cancel(batch_id)
+            raise
+
+        batch_results = await batch_runner.results(batch_id)
+        time_taken = (batch.ended_at - batch.created_at).total_seconds()
+
+        for test in tests:
+            entry = batch_results.get(test["test_id"], {"status": "missing"})
+            result = {
+                "time_taken": time_taken,
+                "mode": "batch",
+                "batch_id": batch_id,
+                "status": entry["status"],
+                "response": entry.get("text"),
+            }
+            self._save_ai_results(test["test_id"], result)
+            results[test["test_id"]] = result
+
+        return results
+
+    def _scenario_prompt(self, test: Dict[str, Any]) -> str:
+        """Build the Claude prompt for a benchmark test's scenario"""
+        scenario = test["scenario"]
+        if scenario.get("prompt"):
+            return scenario["prompt"]
+
+        task = test["test_type"].replace("_", " ")
+        return f"""TASK: {task}
+SCENARIO: {scenario.get('name', 'Benchmark scenario')}
+{scenario.get('description') or to_prompt_json(scenario)}"""
+
     def record_human_results(
         self,
         test_id: str,
@@ -89,25 +284,34 @@ class BenchmarkingSystem:
     ) -> Dict[str, Any]:
         """Record human CPA results for comparison"""
         
-        test = self._get_test(test_id)
-        if not test:
-            return {"error": "Test not found"}
-        
-        test["human_results"] = human_results
-        test["human_completed_at"] = datetime.now().isoformat()
-        test["status"] = "completed"
-        
-        # Calculate comparison
-        comparison = self._calculate_comparison(test)
-        test["comparison"] = comparison
+        # Read-modify-write under the database write lock, so AI results
+        # saved by another worker are compared against rather than overwritten
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                test = self._get_test(test_id)
+                if not test:
+                    return {"error": "Test not found"}
+            
+                test["human_results"] = human_results
+                test["human_completed_at_ns"] = time.time_ns()
+                test["status"] = "completed"
+            
+                # Calculate comparison
+                comparison = self._calculate_comparison(test)
+                test["comparison"] = comparison
+                self._save_test(test)
+            finally:
+                if self.db.in_transaction:
+                    self.db.rollback()
         
         return comparison
     
     def _calculate_comparison(self, test: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate detailed comparison between AI and Human"""
         
-        ai = test.get("ai_results", {})
-        human = test.get("human_results", {})
+        ai = test.get("ai_results") or {}
+        human = test.get("human_results") or {}
         
         comparison = {
             "speed_advantage": "AI" if ai.get("time_taken", 0) < human.get("time_taken", 999) else "Human",
@@ -127,38 +331,97 @@ class BenchmarkingSystem:
         
         return comparison
     
-    def _get_test(self, test_id: str) -> Dict[str, Any]:
+    def _get_test(self, test_id: str) -> Optional[Dict[str, Any]]:
         """Get test by ID"""
-        for test in self.tests:
-            if test["test_id"] == test_id:
-                return test
-        return None
+        with self._lock:
+            row = self.db.execute(
+                "SELECT data FROM benchmark_tests WHERE test_id = ?", (test_id,)
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def _save_test(self, test: Dict[str, Any]):
+        """Insert or update a test row"""
+        comparison = test.get("comparison") or {}
+        with self._lock:
+            self.db.execute(
+                """
+                INSERT INTO benchmark_tests
+                    (test_id, status, created_at_ns, ai_won, speed_multiplier, cost_savings, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (test_id) DO UPDATE SET
+                    status = excluded.status,
+                    ai_won = excluded.ai_won,
+                    speed_multiplier = excluded.speed_multiplier,
+                    cost_savings = excluded.cost_savings,
+                    data = excluded.data
+                """,
+                (
+                    test["test_id"],
+                    test["status"],
+                    test["created_at_ns"],
+                    int(comparison["overall_winner"] == "AI") if comparison else None,
+                    comparison.get("speed_multiplier"),
+                    comparison.get("cost_comparison", {}).get("savings"),
+                    orjson.dumps(test).decode("utf-8"),
+                ),
+            )
+            self.db.commit()
+
+    def _save_ai_results(self, test_id: str, result: Dict[str, Any]):
+        """
+        Store a test's AI results
+
+        Only the AI fields inside `data` are patched; a benchmark run can take
+        minutes (hours in batch mode), and rewriting its stale copy of the row
+        would drop human results recorded by another worker in the meantime.
+        """
+        with self._lock:
+            self.db.execute(
+                """
+                UPDATE benchmark_tests
+                SET data = json_set(data, '$.ai_results', json(?), '$.ai_completed_at_ns', ?)
+                WHERE test_id = ?
+                """,
+                (orjson.dumps(result).decode("utf-8"), time.time_ns(), test_id),
+            )
+            self.db.commit()
     
     def get_all_tests(self) -> List[Dict[str, Any]]:
-        """Get all benchmark tests"""
-        return self.tests
+        """Get all benchmark tests with timestamps rendered as ISO strings"""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT data FROM benchmark_tests ORDER BY created_at_ns, rowid"
+            ).fetchall()
+        return [self._render_test(orjson.loads(row[0])) for row in rows]
+
+    def _render_test(self, test: Dict[str, Any]) -> Dict[str, Any]:
+        """Format epoch-ns timestamps (*_at_ns) as ISO strings (*_at)"""
+        rendered = {}
+        for key, value in test.items():
+            if key.endswith("_at_ns"):
+                rendered[key[:-3]] = datetime.fromtimestamp(value / 1e9).isoformat()
+            else:
+                rendered[key] = value
+        return rendered
     
     def get_leaderboard(self) -> Dict[str, Any]:
         """Generate leaderboard comparing AI vs Human across all tests"""
         
-        ai_wins = sum(1 for t in self.tests if t.get("comparison", {}).get("overall_winner") == "AI")
-        human_wins = len(self.tests) - ai_wins
-        
-        avg_speed_improvement = sum(
-            t.get("comparison", {}).get("speed_multiplier", 0) 
-            for t in self.tests if t.get("comparison")
-        ) / max(len([t for t in self.tests if t.get("comparison")]), 1)
+        with self._lock:
+            total_tests, ai_wins, avg_speed_improvement, total_cost_savings = self.db.execute(
+                """
+                SELECT COUNT(*), COALESCE(SUM(ai_won), 0), AVG(speed_multiplier), COALESCE(SUM(cost_savings), 0)
+                FROM benchmark_tests
+                """
+            ).fetchone()
         
         return {
-            "total_tests": len(self.tests),
+            "total_tests": total_tests,
             "ai_wins": ai_wins,
-            "human_wins": human_wins,
-            "ai_win_rate": ai_wins / max(len(self.tests), 1),
-            "average_speed_improvement": f"{avg_speed_improvement:.1f}x faster",
-            "total_cost_savings": sum(
-                t.get("comparison", {}).get("cost_comparison", {}).get("savings", 0)
-                for t in self.tests
-            )
+            "human_wins": total_tests - ai_wins,
+            "ai_win_rate": ai_wins / max(total_tests, 1),
+            "average_speed_improvement": f"{(avg_speed_improvement or 0):.1f}x faster",
+            "total_cost_savings": total_cost_savings
         }
 
 # Predefined benchmark scenarios
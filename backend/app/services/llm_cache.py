@@ -0,0 +1,86 @@
+"""
+Claude Response Cache
+In-process cache for repeated identical Claude requests (demo scenarios,
+benchmark reruns)
+"""
+from typing import Dict, List, Any
+import hashlib
+import time
+
+import anthropic
+import orjson
+from cachetools import TLRUCache
+
+from app.services.llm_client import call_claude
+
+# Entries are (expires_at, response); per-entry expiry lets callers pick their own TTL
+_cache: TLRUCache = TLRUCache(
+    maxsize=1024,
+    ttu=lambda key, value, now: value[0],
+    timer=time.monotonic,
+)
+
+
+def cache_key(model: str, system: Any, messages: List[Dict[str, Any]], max_tokens: int, **kwargs) -> str:
+    """Content hash of everything that determines a completion"""
+    payload = {
+        "model": model,
+        "system": None if system is anthropic.NOT_GIVEN else system,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "params": kwargs,
+    }
+    return hashlib.blake2b(
+        orjson.dumps(payload, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS),
+        digest_size=32,
+    ).hexdigest()
+
+
+async def cached_call(
+    client: anthropic.AsyncAnthropic,
+    *,
+    model: str,
+    max_tokens: int,
+    messages: List[Dict[str, Any]],
+    system: Any = anthropic.NOT_GIVEN,
+    ttl: float = 3600,
+    **kwargs
+):
+    """
+    call_claude with an in-process response cache
+
+    Requests are sent with temperature=0 (unless overridden) so that a cached
+    reply is one the model would plausibly give again. Failed calls are not
+    cached. The key is built from the full request payload, so send requests
+    carrying large inline content (base64 images) through call_claude instead.
+
+    Args:
+        client: Async client to send the request on
+        ttl: Seconds a cached response stays valid
+        **kwargs: Passed through to call_claude and included in the cache key
+
+    Returns:
+        The Message response, from cache when an identical request was seen
+    """
+    kwargs.setdefault("temperature", 0)
+    key = cache_key(model, system, messages, max_tokens, **kwargs)
+
+    entry = _cache.get(key)
+    if entry is not None:
+        return entry[1]
+
+    response = await call_claude(
+        client,
+        model=model,
+        max_tokens=max_tokens,
+        messages=messages,
+        system=system,
+        **kwargs
+    )
+    _cache[key] = (time.monotonic() + ttl, response)
+    return response
+
+
+def clear_cache() -> None:
+    """Drop every cached response"""
+    _cache.clear()
@@ -0,0 +1,154 @@
+"""
+Shared Claude API Client
+One AsyncAnthropic instance (and connection pool) reused by every agent
+"""
+from typing import Dict, List, Any, Optional
+import os
+import logging
+
+import anthropic
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# One pool for every agent: keep-alive connections skip a TLS handshake per call
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+# Fail fast on connect, but keep the SDK's 10 minute read timeout: a
+# non-streamed call sends nothing until an 8000-token completion is done, and
+# a read timeout there is retried (and billed) as a full regeneration
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+
+_async_client: Optional[anthropic.AsyncAnthropic] = None
+
+
+def get_async_client() -> anthropic.AsyncAnthropic:
+    """
+    Get the process-wide async Claude client
+
+    Created lazily so the API key is read on first use rather than at import
+    time (the tax engine must keep working without ANTHROPIC_API_KEY).
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = anthropic.AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY", ""),
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Close the shared client's connection pool (call on app shutdown)"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def cached_system(text: str) -> List[Dict[str, Any]]:
+    """
+    Wrap a static system prompt as a prompt-cacheable system block
+
+    The text must be byte-identical across calls for the cached prefix to be
+    reused, so pass module-level constants rather than per-call f-strings.
+    Claude only caches prefixes above a minimum length (1024 tokens for
+    Sonnet, 2048 for Haiku); shorter prompts are sent normally and the
+    marker has no effect until the prefix grows past it.
+    """
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+def with_cache_breakpoint(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Copy of a conversation with a prompt-cache breakpoint on its last message
+
+    For multi-turn calls the long, stable prefix is the conversation itself:
+    marking the newest message lets the next turn read everything up to it
+    from cache. The input list and its messages are left unmodified.
+    """
+    if not messages:
+        return messages
+
+    *earlier, last = messages
+    content = last["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    content = list(content)
+    content[-1] = {**content[-1], "cache_control": {"type": "ephemeral"}}
+    return earlier + [{**last, "content": content}]
+
+
+def _latency_headers(latency_mode: bool) -> Optional[Dict[str, str]]:
+    """
+    Extra headers for latency-optimized inference
+
+    Only sent when the deployment has a latency-optimized beta enabled and
+    its name is configured in ANTHROPIC_LATENCY_OPTIMIZED_BETA.
+    """
+    beta = os.getenv("ANTHROPIC_LATENCY_OPTIMIZED_BETA", "")
+    if latency_mode and beta:
+        return {"anthropic-beta": beta}
+    return None
+
+
+async def call_claude(
+    client: anthropic.AsyncAnthropic,
+    *,
+    model: str,
+    max_tokens: int,
+    messages: List[Dict[str, Any]],
+    system: Any = anthropic.NOT_GIVEN,
+    latency_mode: bool = False,
+    **kwargs
+):
+    """
+    Send a Messages API request
+
+    Args:
+        client: Async client to send the request on
+        latency_mode: Request latency-optimized inference for short,
+            interactive calls where time to first token matters
+        **kwargs: Passed through to messages.create
+
+    Returns:
+        The Message response
+    """
+    response = await client.messages.create(
+        model=model,
+        max_tokens=max_tokens,
+        messages=messages,
+        system=system,
+        extra_headers=_latency_headers(latency_mode),
+        **kwargs
+    )
+    # Output usage against the budget, so per-call max_tokens can be sized from real traffic
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        logger.info(
+            "claude call model=%s output_tokens=%d max_tokens=%d",
+            model, usage.output_tokens, max_tokens
+        )
+    if getattr(response, "stop_reason", None) == "max_tokens":
+        logger.warning("Claude response truncated at max_tokens=%d (model=%s)", max_tokens, model)
+    return response
+
+
+def stream_claude(
+    client: anthropic.AsyncAnthropic,
+    *,
+    model: str,
+    max_tokens: int,
+    messages: List[Dict[str, Any]],
+    system: Any = anthropic.NOT_GIVEN,
+    latency_mode: bool = False,
+    **kwargs
+):
+    """Streaming counterpart of call_claude; use with `async with`"""
+    return client.messages.stream(
+        model=model,
+        max_tokens=max_tokens,
+        messages=messages,
+        system=system,
+        extra_headers=_latency_headers(latency_mode),
+        **kwargs
+    )
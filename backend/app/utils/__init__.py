@@ -2,5 +2,6 @@
 Utility modules for AI Tax CPA Agent
 """
 from .conversation_store import ConversationStore
+from .serialization import to_prompt_json
 
-__all__ = ["ConversationStore"]
+__all__ = ["ConversationStore", "to_prompt_json"]
@@ -0,0 +1,20 @@
+"""
+Prompt Serialization
+Fast JSON rendering of client data embedded in Claude prompts
+"""
+from typing import Any
+
+import orjson
+
+_PROMPT_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+
+
+def to_prompt_json(data: Any) -> str:
+    """
+    Render data as indented JSON for inclusion in a prompt
+
+    Drop-in replacement for json.dumps(data, indent=2) using orjson's C
+    encoder. Non-ASCII text is kept as-is instead of \\u-escaped, which also
+    tokenizes shorter.
+    """
+    return orjson.dumps(data, option=_PROMPT_JSON_OPTIONS).decode("utf-8")
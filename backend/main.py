@@ -6,9 +6,9 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, field_validator
-from typing import Dict, List, Any, Optional
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+from typing import Annotated, AsyncIterator, Dict, List, Any, Literal, Optional
 from decimal import Decimal
 import os
 import time
@@ -16,11 +16,14 @@ import logging
 from collections import defaultdict
 from datetime import datetime, timedelta
 
+import orjson
+
 from app.tax_engine.tax_calculator import TaxCalculator, FilingStatus
 from app.agents.tax_prep_agent import TaxPreparationAgent
 from app.agents.audit_agent import AuditDefenseAgent
 from app.agents.document_agent import DocumentAnalysisAgent
 from app.agents.voice_agent import VoiceAgent
+from app.services.llm_client import close_async_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -36,6 +39,7 @@ async def lifespan(app: FastAPI):
     logger.info(f"Environment: {os.getenv('APP_ENV', 'development')}")
     logger.info("=" * 60)
     yield
+    await close_async_client()
 
 
 # Initialize FastAPI app
@@ -112,11 +116,28 @@ async def rate_limit_middleware(request: Request, call_next):
 # REQUEST/RESPONSE MODELS
 # ============================================================================
 
+def _lowercase(value: Any) -> Any:
+    """Normalize case before Literal matching (filing status is case-insensitive)"""
+    return value.lower() if isinstance(value, str) else value
+
+
+# Literal choices and numeric bounds are checked in pydantic-core; only the
+# lowercasing step runs in Python
+FilingStatusInput = Annotated[
+    Literal["single", "married_joint", "married_separate", "head_of_household"],
+    BeforeValidator(_lowercase),
+]
+
+
 class TaxReturnRequest(BaseModel):
     """Request model for tax calculation"""
+    model_config = ConfigDict(extra="forbid")
+
     entity_type: str = Field(..., description="Type of entity (1040, 1120, etc.)")
-    gross_income: float = Field(..., gt=0, description="Gross income (must be positive)")
-    filing_status: str = Field(
+    gross_income: float = Field(
+        ..., gt=0, le=1_000_000_000, description="Gross income (must be positive)"
+    )
+    filing_status: FilingStatusInput = Field(
         default="single",
         description="Filing status: single, married_joint, married_separate, head_of_household"
     )
@@ -125,29 +146,19 @@ class TaxReturnRequest(BaseModel):
     )
     dependents: int = Field(default=0, ge=0, description="Number of dependents")
 
-    @field_validator("gross_income")
-    @classmethod
-    def validate_gross_income(cls, v):
-        if v < 0:
-            raise ValueError("Gross income cannot be negative")
-        if v > 1_000_000_000:  # Sanity check
-            raise ValueError("Gross income exceeds reasonable limit")
-        return v
 
-    @field_validator("filing_status")
-    @classmethod
-    def validate_filing_status(cls, v):
-        valid_statuses = ["single", "married_joint", "married_separate", "head_of_household"]
-        if v.lower() not in valid_statuses:
-            raise ValueError(f"Filing status must be one of: {', '.join(valid_statuses)}")
-        return v.lower()
+class TaxPrepareRequest(BaseModel):
+    """Request model for AI tax return preparation"""
+    entity_type: str = Field(..., description="Type of entity (1040, 1120, etc.)")
+    financial_data: Dict[str, Any] = Field(..., description="Current year financial data")
+    prior_year_return: Optional[Dict[str, Any]] = Field(None, description="Prior year return for reference")
 
 
 class DocumentAnalysisRequest(BaseModel):
     """Request model for document analysis"""
     document_type: str = Field(..., description="Type of document (W-2, 1099, receipt, etc.)")
     document_data: Dict[str, Any] = Field(..., description="Document data as JSON")
-    image_base64: Optional[str] = Field(None, description="Base64 encoded image (optional)")
+    image_base64: Optional[str] = Field(None, description="Base64 encoded PNG, JPEG, GIF or WebP image (optional)")
 
 
 class AuditDefenseRequest(BaseModel):
@@ -184,6 +195,7 @@ async def root():
         "disclaimer": TaxCalculator.LEGAL_DISCLAIMER.strip(),
         "endpoints": {
             "tax_calculation": "/api/tax/calculate",
+            "tax_preparation": "/api/tax/prepare/stream",
             "document_analysis": "/api/documents/analyze",
             "audit_defense": "/api/audit/analyze",
             "voice_agent": "/api/voice/chat (not implemented)",
@@ -278,6 +290,54 @@ async def estimate_quarterly(request: QuarterlyEstimateRequest):
         raise HTTPException(status_code=500, detail="An error occurred. Please try again.")
 
 
+def _sse(data: Any, event: Optional[str] = None) -> bytes:
+    """Encode one Server-Sent Event; JSON keeps multi-line text in a single data field"""
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+@app.post("/api/tax/prepare/stream")
+async def prepare_return_stream(request: TaxPrepareRequest):
+    """
+    Prepare a tax return with AI, streamed as Server-Sent Events
+
+    Each `data:` event carries a JSON string chunk of the draft; a final
+    `done` event (or `error` if generation fails) closes the stream.
+    """
+    if not os.getenv("ANTHROPIC_API_KEY"):
+        raise HTTPException(
+            status_code=503,
+            detail="AI service not configured. Please set ANTHROPIC_API_KEY environment variable."
+        )
+
+    agent = TaxPreparationAgent()
+
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            async for text in agent.stream_return(
+                entity_type=request.entity_type,
+                financial_data=request.financial_data,
+                prior_year_return=request.prior_year_return,
+            ):
+                yield _sse(text)
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.error(f"Error in streamed tax preparation: {str(e)}")
+            yield _sse({"detail": "An error occurred during tax preparation. Please try again."}, "error")
+            return
+        yield _sse({
+            "entity_type": request.entity_type,
+            "status": "draft",
+            "disclaimer": TaxCalculator.LEGAL_DISCLAIMER.strip(),
+        }, "done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ============================================================================
 # DOCUMENT ANALYSIS ENDPOINTS
 # ============================================================================
@@ -314,6 +374,8 @@ async def analyze_document(request: DocumentAnalysisRequest):
 
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in document analysis: {str(e)}")
         # Sanitize error - don't leak API keys or sensitive data
@@ -119,6 +119,26 @@ def test_absurdly_high_income_rejected():
     assert response.status_code == 422
 
 
+def test_filing_status_case_insensitive():
+    response = client.post("/api/tax/calculate", json={
+        "entity_type": "1040",
+        "gross_income": 80000,
+        "filing_status": "Head_Of_Household",
+    })
+    assert response.status_code == 200
+    assert response.json()["data"]["filing_status"] == "head_of_household"
+
+
+def test_unknown_field_rejected():
+    response = client.post("/api/tax/calculate", json={
+        "entity_type": "1040",
+        "gross_income": 80000,
+        "filing_status": "single",
+        "grossincome": 1,
+    })
+    assert response.status_code == 422
+
+
 # ── Quarterly Estimates ────────────────────────────────────────
 
 def test_quarterly_estimate():
@@ -162,6 +182,51 @@ def test_document_analysis_no_api_key(monkeypatch):
     assert response.status_code == 503
 
 
+def test_document_analysis_unsupported_image(monkeypatch):
+    """Non-image upload is rejected before any AI call → 400."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    response = client.post("/api/documents/analyze", json={
+        "document_type": "W-2",
+        "document_data": {},
+        "image_base64": "JVBERi0xLjQKJcfsj6IKNSAwIG9iago=",  # %PDF-1.4
+    })
+    assert response.status_code == 400
+    assert "Unsupported image format" in response.json()["detail"]
+
+
+# ── Tax Preparation ────────────────────────────────────────────
+
+def test_prepare_stream_no_api_key(monkeypatch):
+    """Without ANTHROPIC_API_KEY, streaming preparation returns 503."""
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    response = client.post("/api/tax/prepare/stream", json={
+        "entity_type": "1040",
+        "financial_data": {"wages": 85000},
+    })
+    assert response.status_code == 503
+
+
+def test_prepare_stream_sends_events(monkeypatch):
+    """Draft chunks arrive as SSE data events followed by a done event."""
+    from app.agents.tax_prep_agent import TaxPreparationAgent
+
+    async def fake_stream(self, entity_type, financial_data, prior_year_return=None):
+        yield "Form 1040\n"
+        yield "Line 1: $85,000"
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setattr(TaxPreparationAgent, "stream_return", fake_stream)
+    response = client.post("/api/tax/prepare/stream", json={
+        "entity_type": "1040",
+        "financial_data": {"wages": 85000},
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = response.text.strip().split("\n\n")
+    assert events[:2] == ['data: "Form 1040\\n"', 'data: "Line 1: $85,000"']
+    assert events[2].startswith("event: done\ndata: ")
+
+
 # ── Audit Defense ──────────────────────────────────────────────
 
 def test_audit_defense_no_api_key(monkeypatch):
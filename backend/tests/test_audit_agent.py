@@ -0,0 +1,49 @@
+"""Tests for the audit defense agent (no Claude API calls)."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents.audit_agent import AuditDefenseAgent, JSON_PREFILL
+from app.services import llm_cache
+
+
+class FakeMessages:
+    """Returns a canned continuation of the prefilled assistant turn."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text=self.reply)])
+
+
+def make_agent(reply):
+    llm_cache.clear_cache()
+    agent = AuditDefenseAgent()
+    agent.client = SimpleNamespace(messages=FakeMessages(reply))
+    return agent
+
+
+NOTICE = "CP2000: unreported 1099-NEC income of $12,400 for tax year 2022."
+
+
+@pytest.mark.asyncio
+async def test_prefilled_json_reply_parsed():
+    agent = make_agent('"summary": "Unreported income", "risk_level": "low"}')
+    result = await agent.analyze_audit_notice(NOTICE, {"1099-NEC": "attached"})
+
+    assert result == {"summary": "Unreported income", "risk_level": "low"}
+    messages = agent.client.messages.calls[0]["messages"]
+    assert messages[-1] == {"role": "assistant", "content": JSON_PREFILL}
+    assert "CP2000" in messages[0]["content"]
+
+
+@pytest.mark.asyncio
+async def test_non_json_reply_falls_back_to_raw_text():
+    agent = make_agent("The IRS is questioning unreported income.")
+    result = await agent.analyze_audit_notice(NOTICE, {})
+
+    assert result["analysis"] == "The IRS is questioning unreported income."
+    assert result["risk_level"] == "medium"
@@ -0,0 +1,116 @@
+"""Tests for the message batch runner against a stubbed batches API."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.batch_runner import BatchRunner
+
+
+def text_block(text):
+    return SimpleNamespace(type="text", text=text)
+
+
+def entry(custom_id, result_type, content=None):
+    result = SimpleNamespace(type=result_type)
+    if content is not None:
+        result.message = SimpleNamespace(content=content)
+    return SimpleNamespace(custom_id=custom_id, result=result)
+
+
+class FakeBatches:
+    """Stands in for client.beta.messages.batches."""
+
+    def __init__(self, statuses, entries=()):
+        self.statuses = list(statuses)
+        self.entries = list(entries)
+        self.created = []
+        self.cancelled = []
+
+    async def create(self, requests):
+        self.created.append(requests)
+        return SimpleNamespace(id="msgbatch_1")
+
+    async def retrieve(self, batch_id):
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return SimpleNamespace(id=batch_id, processing_status=status)
+
+    async def cancel(self, batch_id):
+        self.cancelled.append(batch_id)
+
+    async def results(self, batch_id):
+        async def stream():
+            for item in self.entries:
+                yield item
+        return stream()
+
+
+def make_runner(batches):
+    client = SimpleNamespace(beta=SimpleNamespace(messages=SimpleNamespace(batches=batches)))
+    return BatchRunner(client=client, poll_interval=0)
+
+
+def test_build_request_includes_system_only_when_given():
+    plain = BatchRunner.build_request("t1", "model", "Prompt", 100)
+    assert plain == {
+        "custom_id": "t1",
+        "params": {
+            "model": "model",
+            "max_tokens": 100,
+            "messages": [{"role": "user", "content": "Prompt"}],
+        },
+    }
+    assert BatchRunner.build_request("t1", "model", "Prompt", 100, system="CPA")["params"]["system"] == "CPA"
+
+
+@pytest.mark.asyncio
+async def test_submit_and_poll_until_ended():
+    batches = FakeBatches(["in_progress", "in_progress", "ended"])
+    runner = make_runner(batches)
+
+    batch_id = await runner.submit_batch([BatchRunner.build_request("t1", "model", "Prompt", 100)])
+    batch = await runner.poll(batch_id)
+
+    assert batch_id == "msgbatch_1"
+    assert batch.processing_status == "ended"
+    assert len(batches.created[0]) == 1
+
+
+@pytest.mark.asyncio
+async def test_empty_batch_rejected():
+    with pytest.raises(ValueError):
+        await make_runner(FakeBatches(["ended"])).submit_batch([])
+
+
+@pytest.mark.asyncio
+async def test_poll_times_out():
+    runner = make_runner(FakeBatches(["in_progress"]))
+    runner.poll_interval = 0.01
+    with pytest.raises(asyncio.TimeoutError):
+        await runner.poll("msgbatch_1", timeout=0.05)
+
+
+@pytest.mark.asyncio
+async def test_cancel_forwards_batch_id():
+    batches = FakeBatches(["in_progress"])
+    await make_runner(batches).cancel("msgbatch_1")
+    assert batches.cancelled == ["msgbatch_1"]
+
+
+@pytest.mark.asyncio
+async def test_results_keyed_by_custom_id():
+    runner = make_runner(FakeBatches(["ended"], [
+        entry("ok", "succeeded", [text_block("Part one. "), text_block("Part two.")]),
+        entry("empty", "succeeded", []),
+        entry("bad", "errored"),
+        entry("late", "expired"),
+    ]))
+
+    results = await runner.results("msgbatch_1")
+
+    assert results == {
+        "ok": {"status": "succeeded", "text": "Part one. Part two."},
+        "empty": {"status": "succeeded", "text": ""},
+        "bad": {"status": "errored"},
+        "late": {"status": "expired"},
+    }
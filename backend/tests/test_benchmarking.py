@@ -0,0 +1,252 @@
+"""Tests for the AI vs human benchmarking system."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.benchmarking import BenchmarkingSystem, BENCHMARK_SCENARIOS, BENCHMARK_SYSTEM
+
+
+class FakeBatchRunner:
+    """Stands in for BatchRunner without calling the Claude API."""
+
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.submitted = []
+        self.cancelled = []
+
+    async def submit_batch(self, requests):
+        self.submitted.append(requests)
+        return "batch_1"
+
+    async def poll(self, batch_id, timeout=None):
+        created = datetime(2024, 4, 1, 12, 0, 0)
+        return SimpleNamespace(created_at=created, ended_at=created + timedelta(seconds=90))
+
+    async def cancel(self, batch_id):
+        self.cancelled.append(batch_id)
+
+    async def results(self, batch_id):
+        return {
+            request["custom_id"]: (
+                {"status": "errored"} if request["custom_id"] in self.fail_ids
+                else {"status": "succeeded", "text": "Prepared return"}
+            )
+            for request in self.submitted[-1]
+        }
+
+
+@pytest.fixture
+def bench(tmp_path):
+    system = BenchmarkingSystem(db_path=str(tmp_path / "benchmarks.sqlite3"))
+    yield system
+    system.close()
+
+
+def test_create_and_fetch_test(bench):
+    test = bench.create_benchmark_test("tax_preparation", BENCHMARK_SCENARIOS["scenario_1"])
+    assert test["status"] == "pending"
+    assert "created_at_ns" not in test
+    datetime.fromisoformat(test["created_at"])
+    assert bench.get_all_tests() == [test]
+    assert bench._get_test(test["test_id"])["created_at_ns"] > 0
+    assert bench._get_test("missing") is None
+
+
+def test_test_ids_unique_within_same_second(bench):
+    ids = {bench.create_benchmark_test("research", {})["test_id"] for _ in range(50)}
+    assert len(ids) == 50
+
+
+@pytest.mark.asyncio
+async def test_timestamps_rendered_on_read(bench):
+    test = bench.create_benchmark_test("tax_preparation", BENCHMARK_SCENARIOS["scenario_1"])
+    result = await bench.run_ai_benchmark(test["test_id"], {})
+    assert result["time_taken_ns"] >= 0
+    assert result["time_taken"] == result["time_taken_ns"] / 1e9
+
+    rendered = bench.get_all_tests()[0]
+    assert "created_at_ns" not in rendered
+    datetime.fromisoformat(rendered["created_at"])
+    datetime.fromisoformat(rendered["ai_completed_at"])
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_aggregates_completed_tests(bench):
+    done = bench.create_benchmark_test("tax_preparation", BENCHMARK_SCENARIOS["scenario_1"])
+    bench.create_benchmark_test("research", BENCHMARK_SCENARIOS["scenario_2"])
+    await bench.run_ai_benchmark(done["test_id"], {})
+    comparison = bench.record_human_results(
+        done["test_id"], {"time_taken": 3600, "accuracy_score": 0.9}
+    )
+
+    board = bench.get_leaderboard()
+    assert board["total_tests"] == 2
+    assert board["ai_wins"] == 1
+    assert board["human_wins"] == 1
+    assert board["average_speed_improvement"] == f"{comparison['speed_multiplier']:.1f}x faster"
+    assert board["total_cost_savings"] == pytest.approx(comparison["cost_comparison"]["savings"])
+    assert [t["test_id"] for t in bench.get_all_tests()][0] == done["test_id"]
+
+
+def test_empty_leaderboard(bench):
+    board = bench.get_leaderboard()
+    assert board["total_tests"] == 0
+    assert board["average_speed_improvement"] == "0.0x faster"
+
+
+@pytest.mark.asyncio
+async def test_tests_shared_across_instances(bench, tmp_path):
+    """Separate workers on the same database see each other's tests."""
+    test = bench.create_benchmark_test("research", BENCHMARK_SCENARIOS["scenario_3"])
+    await bench.run_ai_benchmark(test["test_id"], {})
+    other = BenchmarkingSystem(db_path=str(tmp_path / "benchmarks.sqlite3"))
+    try:
+        other.record_human_results(test["test_id"], {"time_taken": 60})
+        assert bench._get_test(test["test_id"])["status"] == "completed"
+    finally:
+        other.close()
+
+
+@pytest.mark.asyncio
+async def test_ai_rerun_keeps_human_results_from_other_worker(bench, tmp_path):
+    """A long AI run must not overwrite results another worker saved meanwhile."""
+    test = bench.create_benchmark_test("research", BENCHMARK_SCENARIOS["scenario_3"])
+    await bench.run_ai_benchmark(test["test_id"], {})
+    other = BenchmarkingSystem(db_path=str(tmp_path / "benchmarks.sqlite3"))
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_agent(scenario):
+        started.set()
+        await release.wait()
+        return {"sources_found": 30}
+
+    try:
+        rerun = asyncio.create_task(bench.run_ai_benchmark(test["test_id"], {"research": slow_agent}))
+        await started.wait()
+        other.record_human_results(test["test_id"], {"time_taken": 3600})
+        release.set()
+        await rerun
+    finally:
+        other.close()
+
+    saved = bench._get_test(test["test_id"])
+    assert saved["status"] == "completed"
+    assert saved["human_results"] == {"time_taken": 3600}
+    assert saved["ai_results"]["sources_found"] == 30
+    assert bench.get_leaderboard()["ai_wins"] == 1
+
+
+def test_instance_shared_across_threads(bench):
+    """Sync endpoints run in a threadpool and share one instance."""
+    ids = [bench.create_benchmark_test("research", {})["test_id"] for _ in range(100)]
+
+    def work(i):
+        if i % 2:
+            bench.record_human_results(ids[i], {"time_taken": 60})
+        else:
+            bench._save_ai_results(ids[i], {"time_taken": 1})
+            bench.get_leaderboard()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(work, range(len(ids))))
+
+    board = bench.get_leaderboard()
+    assert board["total_tests"] == 100
+    assert board["ai_wins"] == 50
+    assert sum(t["ai_results"] is not None for t in bench.get_all_tests()) == 50
+
+
+@pytest.mark.asyncio
+async def test_composite_scenario_runs_subtasks_concurrently(bench):
+    running = []
+    peak = 0
+
+    async def agent(scenario):
+        nonlocal peak
+        running.append(1)
+        peak = max(peak, len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return {"accuracy_score": 0.9}
+
+    test = bench.create_benchmark_test(
+        "tax_preparation", {"subtasks": ["tax_preparation", "audit_defense", "research"]}
+    )
+    result = await bench.run_ai_benchmark(
+        test["test_id"], {"tax_preparation": agent, "audit_defense": agent}
+    )
+
+    assert peak == 2
+    assert result["subtasks"]["tax_preparation"] == {"accuracy_score": 0.9}
+    assert result["subtasks"]["research"]["sources_found"] == 23
+    assert result["time_taken"] > 0
+
+
+@pytest.mark.asyncio
+async def test_failing_subtask_reported_without_losing_siblings(bench):
+    async def broken(scenario):
+        raise RuntimeError("agent crashed")
+
+    async def slow(scenario):
+        await asyncio.sleep(0.01)
+        return {"response_quality": 0.9}
+
+    test = bench.create_benchmark_test(
+        "tax_preparation", {"subtasks": ["tax_preparation", "audit_defense"]}
+    )
+    result = await bench.run_ai_benchmark(
+        test["test_id"], {"tax_preparation": broken, "audit_defense": slow}
+    )
+
+    assert result["subtasks"]["tax_preparation"] == {"error": "RuntimeError: agent crashed"}
+    assert result["subtasks"]["audit_defense"] == {"response_quality": 0.9}
+    assert result["error"] == "Subtasks failed: tax_preparation"
+    assert bench._get_test(test["test_id"])["ai_results"] == result
+
+
+@pytest.mark.asyncio
+async def test_benchmark_run_times_out(bench):
+    async def stuck(scenario):
+        await asyncio.sleep(10)
+
+    test = bench.create_benchmark_test("research", {})
+    result = await bench.run_ai_benchmark(test["test_id"], {"research": stuck}, timeout=0.01)
+    assert result == {"error": "Benchmark timed out"}
+    assert bench._get_test(test["test_id"])["ai_results"] == result
+
+
+@pytest.mark.asyncio
+async def test_batch_run_submits_one_request_per_test(bench):
+    first = bench.create_benchmark_test("tax_preparation", BENCHMARK_SCENARIOS["scenario_1"])
+    second = bench.create_benchmark_test("audit_defense", BENCHMARK_SCENARIOS["scenario_3"])
+    runner = FakeBatchRunner(fail_ids={second["test_id"]})
+
+    results = await bench.run_ai_benchmark_batch(
+        [first["test_id"], second["test_id"], "ghost"], runner
+    )
+
+    assert len(runner.submitted) == 1
+    assert [r["custom_id"] for r in runner.submitted[0]] == [first["test_id"], second["test_id"]]
+    assert runner.submitted[0][0]["params"]["system"] == BENCHMARK_SYSTEM
+    assert results[first["test_id"]]["status"] == "succeeded"
+    assert results[first["test_id"]]["time_taken"] == 90
+    assert results[second["test_id"]]["status"] == "errored"
+    assert results["ghost"] == {"error": "Test not found"}
+    assert bench._get_test(first["test_id"])["ai_results"]["mode"] == "batch"
+
+
+@pytest.mark.asyncio
+async def test_batch_run_with_no_known_tests_submits_nothing(bench):
+    runner = FakeBatchRunner()
+    results = await bench.run_ai_benchmark_batch(["ghost"], runner)
+    assert results == {"ghost": {"error": "Test not found"}}
+    assert runner.submitted == []
+
+
+def test_scenario_prompt_override(bench):
+    test = bench.create_benchmark_test("research", {"prompt": "Explain IRC 280A"})
+    assert bench._scenario_prompt(test) == "Explain IRC 280A"
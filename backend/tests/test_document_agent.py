@@ -0,0 +1,135 @@
+"""Tests for the document analysis agent (no Claude API calls)."""
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents.document_agent import DocumentAnalysisAgent, detect_image_media_type
+from app.services import llm_cache
+
+
+class FakeMessages:
+    """Records requests and tracks how many are in flight at once."""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            content = kwargs["messages"][0]["content"]
+            if isinstance(content, str) and "BROKEN" in content:
+                raise RuntimeError("API error")
+            return SimpleNamespace(content=[SimpleNamespace(text="Looks fine")])
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def agent():
+    llm_cache.clear_cache()
+    agent = DocumentAnalysisAgent()
+    agent.client = SimpleNamespace(messages=FakeMessages())
+    yield agent
+    llm_cache.clear_cache()
+
+
+@pytest.mark.asyncio
+async def test_analyze_many_caps_concurrency(agent):
+    documents = [{"type": "W-2", "wages": 50000 + i} for i in range(7)]
+    result = await agent.analyze_many(documents, max_concurrency=3)
+
+    assert agent.client.messages.peak == 3
+    assert len(agent.client.messages.calls) == 7
+    assert result["documents_analyzed"] == 7
+    assert result["documents_failed"] == 0
+    assert [a["document_type"] for a in result["analyses"]] == ["W-2"] * 7
+
+
+@pytest.mark.asyncio
+async def test_analyze_many_reports_failures_in_place(agent):
+    documents = [
+        {"type": "W-2", "wages": 50000},
+        {"type": "1099-NEC", "note": "BROKEN"},
+        {"type": "receipt", "amount": 120},
+    ]
+    result = await agent.analyze_many(documents)
+
+    assert result["documents_analyzed"] == 2
+    assert result["documents_failed"] == 1
+    assert result["analyses"][1] == {"document_type": "1099-NEC", "error": "Analysis failed"}
+    assert result["analyses"][0]["analysis"] == "Looks fine"
+    assert result["analyses"][2]["document_type"] == "receipt"
+
+
+@pytest.mark.asyncio
+async def test_analyze_many_propagates_cancellation(agent):
+    async def cancelled(*args, **kwargs):
+        raise asyncio.CancelledError()
+
+    agent.analyze_document = cancelled
+    with pytest.raises(asyncio.CancelledError):
+        await agent.analyze_many([{"type": "W-2"}])
+
+
+IMAGES = {
+    "image/png": b"\x89PNG\r\n\x1a\n" + b"\x00" * 32,
+    "image/jpeg": b"\xff\xd8\xff\xe0" + b"\x00" * 32,
+    "image/gif": b"GIF89a" + b"\x00" * 32,
+    "image/webp": b"RIFF\x24\x00\x00\x00WEBPVP8 " + b"\x00" * 32,
+}
+
+
+@pytest.mark.parametrize("media_type,data", IMAGES.items())
+def test_detect_image_media_type(media_type, data):
+    assert detect_image_media_type(data[:12]) == media_type
+
+
+def test_detect_gif87a():
+    assert detect_image_media_type(b"GIF87a\x00\x00") == "image/gif"
+
+
+@pytest.mark.parametrize("header", [b"%PDF-1.7\n", b"RIFF\x00\x00\x00\x00WAVE", b""])
+def test_detect_rejects_other_data(header):
+    with pytest.raises(ValueError):
+        detect_image_media_type(header)
+
+
+def sent_image(agent):
+    return agent.client.messages.calls[-1]["messages"][0]["content"][0]["source"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("media_type,data", IMAGES.items())
+async def test_image_input_forms_send_same_request(agent, tmp_path, media_type, data):
+    path = tmp_path / "scan.bin"
+    path.write_bytes(data)
+    encoded = base64.b64encode(data).decode("ascii")
+
+    for kwargs in ({"image_base64": encoded}, {"image_bytes": data}, {"image_path": path}):
+        result = await agent.analyze_document("W-2", {}, **kwargs)
+        assert result["extracted_data"] == "Looks fine"
+        assert sent_image(agent) == {"type": "base64", "media_type": media_type, "data": encoded}
+
+
+@pytest.mark.asyncio
+async def test_empty_image_rejected(agent, tmp_path):
+    path = tmp_path / "empty.png"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError, match="empty"):
+        await agent.analyze_document("W-2", {}, image_path=path)
+    with pytest.raises(ValueError, match="empty"):
+        await agent.analyze_document("W-2", {}, image_bytes=b"")
+    assert agent.client.messages.calls == []
+
+
+@pytest.mark.asyncio
+async def test_invalid_base64_rejected(agent):
+    with pytest.raises(ValueError, match="base64"):
+        await agent.analyze_document("W-2", {}, image_base64="not base64!!")
@@ -0,0 +1,77 @@
+"""Tests for the Claude response cache."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import llm_cache
+
+
+class FakeMessages:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.fail:
+            raise RuntimeError("API down")
+        return SimpleNamespace(content=[SimpleNamespace(text=f"reply {len(self.calls)}")])
+
+
+@pytest.fixture
+def client():
+    llm_cache.clear_cache()
+    yield SimpleNamespace(messages=FakeMessages())
+    llm_cache.clear_cache()
+
+
+def request(**overrides):
+    params = {
+        "model": "claude-sonnet-4-20250514",
+        "max_tokens": 100,
+        "system": "You are a CPA.",
+        "messages": [{"role": "user", "content": "Is my home office deductible?"}],
+    }
+    params.update(overrides)
+    return params
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_hit_cache(client):
+    first = await llm_cache.cached_call(client, **request())
+    second = await llm_cache.cached_call(client, **request())
+    assert second is first
+    assert len(client.messages.calls) == 1
+    assert client.messages.calls[0]["temperature"] == 0
+
+
+@pytest.mark.asyncio
+async def test_different_inputs_miss_cache(client):
+    await llm_cache.cached_call(client, **request())
+    await llm_cache.cached_call(client, **request(max_tokens=200))
+    await llm_cache.cached_call(client, **request(system="You are an IRS agent."))
+    await llm_cache.cached_call(client, **request(messages=[{"role": "user", "content": "Other"}]))
+    assert len(client.messages.calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_refetched(client):
+    await llm_cache.cached_call(client, **request(), ttl=-1)
+    await llm_cache.cached_call(client, **request())
+    assert len(client.messages.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_not_cached(client):
+    client.messages.fail = True
+    with pytest.raises(RuntimeError):
+        await llm_cache.cached_call(client, **request())
+    client.messages.fail = False
+    response = await llm_cache.cached_call(client, **request())
+    assert response.content[0].text == "reply 2"
+
+
+def test_key_ignores_dict_ordering():
+    a = llm_cache.cache_key("m", None, [{"role": "user", "content": "x"}], 10)
+    b = llm_cache.cache_key("m", None, [{"content": "x", "role": "user"}], 10)
+    assert a == b
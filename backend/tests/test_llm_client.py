@@ -0,0 +1,21 @@
+"""Tests for the shared Claude client."""
+import pytest
+
+from app.services import llm_client
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(llm_client, "_async_client", None)
+    yield llm_client.get_async_client()
+    monkeypatch.setattr(llm_client, "_async_client", None)
+
+
+def test_client_is_shared(client):
+    assert llm_client.get_async_client() is client
+
+
+def test_long_completions_do_not_hit_read_timeout(client):
+    timeout = client.timeout
+    assert timeout.connect == 5.0
+    assert timeout.read >= 600.0
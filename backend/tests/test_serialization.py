@@ -0,0 +1,17 @@
+"""Tests for prompt JSON serialization."""
+import json
+
+from app.utils.serialization import to_prompt_json
+
+
+def test_matches_stdlib_indented_output():
+    data = {"employer": "Test Corp", "wages": 75000, "boxes": [1, 2.5, None, True]}
+    assert to_prompt_json(data) == json.dumps(data, indent=2)
+
+
+def test_non_string_keys_allowed():
+    assert json.loads(to_prompt_json({2024: "current"})) == {"2024": "current"}
+
+
+def test_non_ascii_not_escaped():
+    assert "José" in to_prompt_json({"name": "José"})
@@ -1,6 +1,7 @@
 """Tests for the tax calculation engine."""
 from decimal import Decimal
 
+import numpy as np
 import pytest
 
 from app.tax_engine.tax_calculator import TaxCalculator, FilingStatus
@@ -73,6 +74,41 @@ def test_very_high_income(calc):
     assert top_bracket["rate"] == 37.0
 
 
+# ── Batch individual tax ───────────────────────────────────────
+
+def test_batch_matches_single_calculation(calc):
+    """Vectorized path agrees with the Decimal path to the cent."""
+    incomes = [0, 14600, 30000, 75000.55, 150000, 487450.99, 1000000]
+    for status in ["single", "married_joint", "married_separate", "head_of_household"]:
+        batch = calc.calculate_individual_tax_batch(np.array(incomes), status)
+        for income, tax in zip(incomes, batch):
+            single = calc.calculate_individual_tax(Decimal(str(income)), status)
+            assert tax == single["tax_liability"], f"{status} @ {income}"
+
+
+def test_batch_mixed_statuses_and_itemized(calc):
+    result = calc.calculate_individual_tax_batch(
+        np.array([100000, 120000]),
+        np.array(["Single", "married_joint"]),
+        itemized_deductions=np.array([25000, 0]),
+    )
+    itemized = calc.calculate_individual_tax(
+        Decimal("100000"), "single", itemized_deductions=Decimal("25000")
+    )
+    joint = calc.calculate_individual_tax(Decimal("120000"), "married_joint")
+    assert result.tolist() == [itemized["tax_liability"], joint["tax_liability"]]
+
+
+def test_batch_negative_income_rejected(calc):
+    with pytest.raises(ValueError, match="negative"):
+        calc.calculate_individual_tax_batch(np.array([50000, -1]), "single")
+
+
+def test_batch_invalid_filing_status(calc):
+    with pytest.raises(ValueError, match="Invalid filing status"):
+        calc.calculate_individual_tax_batch(np.array([50000]), np.array(["divorced"]))
+
+
 # ── Corporate tax ──────────────────────────────────────────────
 
 def test_corporate_flat_rate(calc):
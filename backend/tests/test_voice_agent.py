@@ -0,0 +1,238 @@
+"""Tests for VoiceAgent conversation state (no Claude API calls)."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents.voice_agent import VoiceAgent, MAX_HISTORY_MESSAGES
+
+
+class FakeStream:
+    """Stands in for the SDK's MessageStream context manager."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        return self._tokens()
+
+    async def _tokens(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeMessages:
+    """Records requests; streams a canned reply and returns numbered summaries."""
+
+    def __init__(self, chunks=("Sure. ", "Let me check that."), summary="summary"):
+        self.chunks = list(chunks)
+        self.summary = summary
+        self.stream_calls = []
+        self.create_calls = []
+
+    def stream(self, **kwargs):
+        # Copy: the agent appends the reply to the same history list afterwards
+        self.stream_calls.append({**kwargs, "messages": list(kwargs["messages"])})
+        return FakeStream(self.chunks)
+
+    async def create(self, **kwargs):
+        self.create_calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text=f"{self.summary} {len(self.create_calls)}")])
+
+
+@pytest.fixture
+def make_agent(tmp_path, monkeypatch):
+    """Build agents whose conversation store lives in a temp directory."""
+    monkeypatch.chdir(tmp_path)
+
+    def make(session_id="call_1", **kwargs):
+        agent = VoiceAgent(session_id=session_id)
+        agent.client = SimpleNamespace(messages=FakeMessages(**kwargs))
+        return agent
+
+    return make
+
+
+async def talk(agent, turns, start=0):
+    """Run user turns through the agent and wait for background summaries."""
+    for i in range(start, start + turns):
+        await agent.handle_live_conversation(f"question {i}", {})
+    await asyncio.gather(*agent._summary_tasks)
+
+
+def stored(agent):
+    return agent.conversation_store.get_messages(agent.session_id)
+
+
+@pytest.mark.asyncio
+async def test_short_call_not_trimmed(make_agent):
+    agent = make_agent()
+    await talk(agent, 3)
+    assert len(agent.conversation_history) == 6
+    assert agent.client.messages.create_calls == []
+    assert agent.conversation_summary is None
+
+
+@pytest.mark.asyncio
+async def test_history_trimmed_to_window_starting_on_user_turn(make_agent):
+    agent = make_agent()
+    await talk(agent, 7)
+
+    sent = agent.client.messages.stream_calls[-1]["messages"]
+    # 13 messages -> cutting one would start on an assistant turn, so two go
+    assert len(sent) == MAX_HISTORY_MESSAGES - 1
+    assert sent[0] == {"role": "user", "content": "question 1"}
+    assert len(agent.conversation_history) == MAX_HISTORY_MESSAGES
+    assert agent.conversation_history[0]["role"] == "user"
+
+    # The dropped pair was summarized with the small model and persisted
+    summary_request = agent.client.messages.create_calls[0]
+    assert "USER: question 0" in summary_request["messages"][0]["content"]
+    assert agent.conversation_summary == "summary 1"
+    summary_entry = [m for m in stored(agent) if m["role"] == "system"][-1]
+    assert summary_entry["content"] == "summary 1"
+    assert summary_entry["metadata"]["summarized_through"] == 2
+
+    # Later turns carry the summary in the system prompt
+    await talk(agent, 1, start=7)
+    system = agent.client.messages.stream_calls[-1]["system"]
+    assert "Earlier in the call: summary 1" in system[-1]["text"]
+
+
+@pytest.mark.asyncio
+async def test_reloaded_session_resumes_after_summarized_turns(make_agent):
+    agent = make_agent()
+    await talk(agent, 7)
+
+    # Each API request builds a fresh agent for the session
+    reloaded = make_agent(summary="recap")
+    assert reloaded.conversation_summary == "summary 1"
+    assert reloaded.conversation_history[0] == {"role": "user", "content": "question 1"}
+    assert reloaded.conversation_history == agent.conversation_history
+    assert reloaded._stored_turns == 14
+
+    await talk(reloaded, 1, start=7)
+    summary_entry = [m for m in stored(reloaded) if m["role"] == "system"][-1]
+    assert summary_entry["metadata"]["summarized_through"] == 4
+    assert "PREVIOUS SUMMARY: summary 1" in reloaded.client.messages.create_calls[0]["messages"][0]["content"]
+
+    again = make_agent()
+    assert again.conversation_summary == "recap 1"
+    assert again.conversation_history[0] == {"role": "user", "content": "question 2"}
+    assert again._stored_turns == 16
+
+
+@pytest.mark.asyncio
+async def test_stale_summary_does_not_replace_newer_one(make_agent):
+    agent = make_agent()
+    agent.conversation_summary = "newer"
+    agent._summarized_through = 4
+
+    await agent._summarize_turns(
+        [{"role": "user", "content": "old"}], summarized_through=2, session_id=agent.session_id
+    )
+
+    assert agent.conversation_summary == "newer"
+    assert agent._summarized_through == 4
+    assert stored(agent) == []
+
+
+def test_reload_uses_summary_covering_most_turns(make_agent):
+    agent = make_agent()
+    for i in range(6):
+        agent.conversation_store.save_message(agent.session_id, "user" if i % 2 == 0 else "assistant", f"turn {i}")
+    # A slow summary from an earlier request lands after a newer one
+    agent.conversation_store.save_message(agent.session_id, "system", "newer", {"summarized_through": 4})
+    agent.conversation_store.save_message(agent.session_id, "system", "older", {"summarized_through": 2})
+
+    reloaded = make_agent()
+    assert reloaded.conversation_summary == "newer"
+    assert reloaded.conversation_history == [
+        {"role": "user", "content": "turn 4"},
+        {"role": "assistant", "content": "turn 5"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_reset_clears_summary_state(make_agent):
+    agent = make_agent()
+    await talk(agent, 7)
+    agent.reset_conversation()
+    assert agent.conversation_history == []
+    assert agent.conversation_summary is None
+    assert agent._stored_turns == 0
+
+
+@pytest.mark.asyncio
+async def test_summary_finishing_after_reset_is_dropped(make_agent):
+    agent = make_agent()
+    for i in range(7):
+        await agent.handle_live_conversation(f"question {i}", {})
+    pending = list(agent._summary_tasks)
+    assert pending
+
+    agent.reset_conversation()
+    await asyncio.gather(*pending)
+
+    assert agent.conversation_summary is None
+    assert agent._summarized_through == 0
+    assert stored(agent) == []
+    assert make_agent(session_id=agent.session_id).conversation_history == []
+
+
+@pytest.mark.asyncio
+async def test_stream_splits_on_sentence_ends_only(make_agent):
+    agent = make_agent(chunks=[
+        "Um, the refund was $1.", "5 million... ", "we filed", " it. Next step", "s follow"
+    ])
+    sentences = [s async for s in agent.stream_live_conversation("status?", {})]
+    assert sentences == ["Um, the refund was $1.5 million... we filed it.", "Next steps follow"]
+
+
+@pytest.mark.asyncio
+async def test_reply_added_to_history_after_stream_closes(make_agent):
+    agent = make_agent(chunks=["First point. ", "Second point."])
+    stream = agent.stream_live_conversation("hello", {})
+
+    assert await stream.__anext__() == "First point."
+    assert agent.conversation_history[-1] == {"role": "user", "content": "hello"}
+
+    assert [s async for s in stream] == ["Second point."]
+    assert agent.conversation_history[-1] == {
+        "role": "assistant", "content": "First point. Second point."
+    }
+    saved = stored(agent)[-1]
+    assert saved["role"] == "assistant"
+    assert saved["metadata"]["ttft_ms"] == agent.last_ttft_ms
+
+
+@pytest.mark.asyncio
+async def test_live_turn_reports_latency_and_markup(make_agent):
+    agent = make_agent(chunks=["Well, um, ", "let me see... ", "Yes."])
+    result = await agent.handle_live_conversation("Is it filed?", {"client_name": "Acme"})
+
+    assert result["response_text"] == "Well, um, let me see... Yes."
+    assert '<break time="500ms"/>' in result["speech_markup"]
+    assert result["ttft_ms"] >= 0
+    assert result["first_sentence_ms"] >= result["ttft_ms"]
+
+
+@pytest.mark.asyncio
+async def test_cache_breakpoint_on_newest_message_only(make_agent):
+    agent = make_agent()
+    await talk(agent, 2)
+
+    sent = agent.client.messages.stream_calls[-1]["messages"]
+    assert sent[-1]["content"] == [
+        {"type": "text", "text": "question 1", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert all(isinstance(m["content"], str) for m in sent[:-1])
+    # The stored history keeps plain text turns
+    assert agent.conversation_history[2] == {"role": "user", "content": "question 1"}